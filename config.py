@@ -1,11 +1,70 @@
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import SecretStr
 
 SCHEDULE_TIME = {"hour": 9, "minute": 0}
 TIMEZONE = "Asia/Irkutsk"
 
-subscribed_users: set[int | None] = set()
-user_cities: dict[int | None, str | None] = {}
+# Каталог для локальных хранилищ бота
+DATA_DIR = "data"
+# Сколько хранить историю показаний (секунды)
+READINGS_RETENTION = 30 * 24 * 60 * 60
+
+# Сколько прогноз по городу считается свежим (секунды)
+FORECAST_TTL = 10 * 60
+# Прогноз по дням OpenWeatherMap обновляется раз в 3 часа (секунды)
+DAILY_FORECAST_TTL = 3 * 60 * 60
+# Сколько помнить, что город не найден (секунды)
+FORECAST_NEGATIVE_TTL = 60
+# Сколько inline-запрос может ждать холодной загрузки прогноза (секунды)
+INLINE_DEADLINE = 1.5
+# Сколько ждать объединенный отчет после предварительного (секунды)
+PROGRESSIVE_TIMEOUT = 8
+# Сравнение городов: сколько городов за раз и общий срок ответа (секунды)
+COMPARE_MAX_CITIES = 4
+COMPARE_DEADLINE = 5
+# Сколько после истечения TTL отдавать устаревший прогноз, обновляя его в фоне
+FORECAST_GRACE = 5 * 60
+# Фоновое обновление популярных городов: сколько городов, как часто
+# и за сколько секунд до истечения TTL (секунды)
+REFRESH_TOP_K = 20
+REFRESH_INTERVAL = 60
+REFRESH_AHEAD = 2 * 60
+# Как часто популярность городов уменьшается вдвое (секунды)
+POPULARITY_DECAY_INTERVAL = 60 * 60
+# Запросы к источникам из одного чата: пополнение в секунду и запас
+THROTTLE_RATE = 1 / 10
+THROTTLE_BURST = 3
+# Разбор страниц Gismeteo: режим (inline, thread, process), число воркеров,
+# сколько задач может ждать в пуле и сколько ждать места в нем (секунды)
+PARSE_MODE = "process"
+PARSE_WORKERS = 2
+PARSE_QUEUE_LIMIT = 8
+PARSE_QUEUE_TIMEOUT = 10
+# Пакетная загрузка страниц Gismeteo: всего запросов одновременно,
+# запросов к одному сайту одновременно и пауза между их началом (секунды)
+CRAWL_CONCURRENCY = 4
+CRAWL_PER_HOST = 2
+CRAWL_HOST_DELAY = 1.0
+# Уровень логирования и доля отладочных записей, которые попадают в лог
+LOG_LEVEL = "INFO"
+LOG_DEBUG_SAMPLE_RATE = 0.1
+# Профилирование по команде администратора: длительность по умолчанию,
+# наибольшая длительность (секунды) и сколько функций показать в сводке
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
+PROFILE_TOP = 15
+# Лимиты внешних источников: запросов в минуту и допустимый всплеск.
+# Лимит общий для всех процессов бота и планировщика
+UPSTREAM_LIMITS = {
+    "openweathermap": (50, 10),
+    "gismeteo": (30, 5),
+}
+# Сколько токенов фоновые загрузки оставляют интерактивным запросам
+UPSTREAM_INTERACTIVE_RESERVE = 2
+# Сколько ждать ответа внешнего источника (секунды)
+UPSTREAM_TIMEOUT = 10
 
 
 class Settings(BaseSettings):
@@ -16,4 +75,17 @@ class Settings(BaseSettings):
         env_file_encoding="utf-8"
     )
 
-config = Settings()
+
+@lru_cache(maxsize=None)
+def get_config() -> Settings:
+    """
+    Настройки читаются из .env при первом обращении, а не при импорте
+    """
+
+    return Settings()
+
+
+def __getattr__(name: str):
+    if name == "config":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
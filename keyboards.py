@@ -7,11 +7,16 @@ from aiogram.types import (
 
 # Создаем кнопки для главного меню
 button_get_weather_forecast = KeyboardButton(text="Получить прогноз погоды🌤️")
+button_send_location = KeyboardButton(
+    text="Погода по местоположению📍",
+    request_location=True
+)
 
 # Создаем клавиатуру главного меню
 main_menu_keyboard = ReplyKeyboardMarkup(
     keyboard=[
-        [button_get_weather_forecast]
+        [button_get_weather_forecast],
+        [button_send_location]
     ],
     resize_keyboard=True
 )
@@ -1,24 +1,33 @@
 import asyncio
 import logging
+import os
+import signal
+import sys
+from typing import Optional
 
-from aiogram import Bot, Dispatcher
-from aiogram.types import BotCommand
+from aiogram import Bot
 
-from config import config
-from services.scheduler import scheduler_service
-from routers.mainRouter import router as main_router
-from routers.weatherRouters import router as weather_router
-from routers.subscribeRouter import router as subscribe_router
+from config import DATA_DIR, PROFILE_DEFAULT_SECONDS, get_config
+from services.logging_setup import setup_logging
+from services.process_lock import ProcessLock
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
+# Роли процесса: обработка сообщений, планировщик рассылки или оба сразу
+ROLE_BOT = "bot"
+ROLE_SCHEDULER = "scheduler"
+ROLE_ALL = "all"
+ROLES = (ROLE_BOT, ROLE_SCHEDULER, ROLE_ALL)
+
+# Планировщик активен только в одном процессе
+SCHEDULER_LOCK_PATH = os.path.join(DATA_DIR, "scheduler.lock")
+# Как часто резервный планировщик проверяет блокировку (секунды)
+SCHEDULER_LOCK_RETRY = 30
+
 
 async def set_main_menu(bot: Bot) -> None:
+    from aiogram.types import BotCommand
+
     main_menu_commands: list[BotCommand] = [
         BotCommand(
             command="/help",
@@ -35,41 +44,227 @@ async def set_main_menu(bot: Bot) -> None:
         BotCommand(
             command="/unsubscribe",
             description="Отписаться от ежедневной рассылки бота"
+        ),
+        BotCommand(
+            command="/forecast",
+            description="Прогноз на несколько дней"
+        ),
+        BotCommand(
+            command="/compare",
+            description="Сравнить погоду в нескольких городах"
+        ),
+        BotCommand(
+            command="/alerts",
+            description="Оповещения о погоде"
         )
     ]
 
     await bot.set_my_commands(main_menu_commands)
 
 
-async def main():
-    logger.info("Запуск бота погоды...")
-    
-    # Инициализация бота и диспетчера
-    bot = Bot(token=config.bot_token.get_secret_value())
+async def run_background(bot: Bot, wait_for_lock: bool) -> Optional[ProcessLock]:
+    """
+    Запуск планировщика и воркеров рассылки, если роль планировщика свободна
+    """
+
+    from services.outbox import get_outbox_workers
+    from services.scheduler import get_scheduler_service
+
+    lock = ProcessLock(SCHEDULER_LOCK_PATH)
+    while not lock.acquire():
+        if not wait_for_lock:
+            logger.warning("Планировщик уже работает в другом процессе")
+            return None
+        logger.info("Планировщик занят другим процессом, ждем...")
+        await asyncio.sleep(SCHEDULER_LOCK_RETRY)
+
+    # Настройка и запуск планировщика
+    scheduler_service = get_scheduler_service()
+    scheduler_service.setup_schedule()
+    scheduler_service.schedule_resume()
+    scheduler_service.start()
+
+    # Воркеры очереди отправки
+    get_outbox_workers().start(bot)
+    logger.info("Планировщик запущен")
+    return lock
+
+
+async def stop_background(lock: Optional[ProcessLock]) -> None:
+    if lock is None:
+        return
+
+    from services.outbox import get_outbox_workers
+    from services.scheduler import get_scheduler_service
+
+    get_scheduler_service().shutdown()
+    await get_outbox_workers().stop()
+    lock.release()
+
+
+def profile_on_signal(bot: Bot) -> None:
+    """
+    kill -USR1 <pid> запускает профилирование процесса со сводкой администратору
+    """
+
+    if not hasattr(signal, "SIGUSR1"):
+        return
+
+    from services.profiler import report_to_admin
+
+    tasks: set[asyncio.Task] = set()
+
+    def start() -> None:
+        task = asyncio.create_task(report_to_admin(bot, PROFILE_DEFAULT_SECONDS))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, start)
+
+
+async def run_bot(bot: Bot) -> None:
+    """
+    Обработка сообщений: модули бота загружаются только в этой роли
+    """
+
+    from aiogram import Dispatcher
+
+    from middlewares.chat_order import ChatOrderMiddleware
+    from middlewares.correlation import CorrelationMiddleware
+    from routers.adminRouter import router as admin_router
+    from routers.alertsRouter import router as alerts_router
+    from routers.compareRouter import router as compare_router
+    from routers.inlineRouter import router as inline_router
+    from routers.mainRouter import router as main_router
+    from routers.subscribeRouter import router as subscribe_router
+    from routers.weatherRouters import router as weather_router
+    from services.alerts import get_alert_engine
+    from services.forecast import get_forecast_service
+    from services.refresher import get_forecast_refresher
+    from services.subscriptions import load_subscriptions
+    from services.warm_restart import load_warm_state
+
+    load_subscriptions()
+    # Кэши прошлого запуска подгружаются из снимка по мере обращений
+    load_warm_state()
+    # Новые прогнозы проверяются по правилам оповещений
+    get_forecast_service().listeners.append(get_alert_engine().observe)
+    # Популярные города обновляются до истечения кэша
+    get_forecast_refresher().start()
+
     dp = Dispatcher()
-    
+    # Идентификатор апдейта - в каждой записи лога его обработки
+    dp.update.outer_middleware(CorrelationMiddleware())
+    # Сообщения одного чата - по очереди, разных чатов - параллельно
+    dp.update.outer_middleware(ChatOrderMiddleware())
+
     # Настройка роутеров
     dp.include_router(main_router)
     dp.include_router(weather_router)
     dp.include_router(subscribe_router)
+    dp.include_router(inline_router)
+    dp.include_router(alerts_router)
+    dp.include_router(compare_router)
+    dp.include_router(admin_router)
+
+    # Запуск бота
+    await bot.delete_webhook(drop_pending_updates=True)
+    dp.startup.register(set_main_menu)
+    await dp.start_polling(bot)
+
+
+async def stop_bot() -> None:
+    from services.refresher import get_forecast_refresher
+    from services.warm_restart import save_warm_state
+
+    await get_forecast_refresher().stop()
+    save_warm_state()
+
+
+def shutdown_services() -> None:
+    """
+    Остановка общих сервисов - только тех, что успели понадобиться
+    """
+
+    if "services.parse_pool" in sys.modules:
+        sys.modules["services.parse_pool"].get_parse_pool().shutdown()
+    if "services.source_weights" in sys.modules:
+        sys.modules["services.source_weights"].get_source_weights().save()
+
+
+async def main(role: str = ROLE_ALL):
+    logger.info(f"Запуск бота погоды, роль: {role}")
     
-    # Настройка и запуск планировщика
-    scheduler_service.setup_schedule(bot)
-    scheduler_service.start()
+    # Инициализация бота и диспетчера
+    bot = Bot(token=get_config().bot_token.get_secret_value())
+    lock: Optional[ProcessLock] = None
 
     try:
-        # Запуск бота
-        await bot.delete_webhook(drop_pending_updates=True)
-        dp.startup.register(set_main_menu)
-        await dp.start_polling(bot)
+        if role in (ROLE_ALL, ROLE_SCHEDULER):
+            # Отдельный процесс планировщика ждет, пока роль освободится
+            lock = await run_background(bot, wait_for_lock=role == ROLE_SCHEDULER)
+
+        if role in (ROLE_ALL, ROLE_BOT):
+            await run_bot(bot)
+        else:
+            # У процесса планировщика нет команд - профиль снимается по SIGUSR1
+            profile_on_signal(bot)
+            # Процесс планировщика работает до остановки
+            await asyncio.Event().wait()
     except Exception as e:
         logger.error(f"Ошибка при работе бота: {e}")
     finally:
         # Корректное завершение
-        scheduler_service.shutdown()
+        await stop_background(lock)
+        if role in (ROLE_ALL, ROLE_BOT):
+            await stop_bot()
+        shutdown_services()
         await bot.session.close()
         logger.info("Бот остановлен")
 
 
+def parse_role(argv: list[str]) -> str:
+    """
+    Роль процесса: python main.py --role bot|scheduler|all
+    """
+
+    if "--role" not in argv:
+        return ROLE_ALL
+
+    index = argv.index("--role") + 1
+    role = argv[index] if index < len(argv) else ""
+    if role not in ROLES:
+        raise SystemExit(f"Неизвестная роль: {role!r}, ожидается одна из {', '.join(ROLES)}")
+    return role
+
+
+def startup_profile() -> None:
+    """
+    Режим измерения времени запуска: python main.py --startup-profile
+    """
+
+    from services.analyze_data import get_weather_analyzer
+    from services.parse_gismeteo import get_gismeteo_parser
+    from services.scheduler import get_scheduler_service
+    from services.startup_profile import startup_report
+    from services.weather import get_weather_service
+
+    print(startup_report({
+        "config": get_config,
+        "weather_service": get_weather_service,
+        "gismeteo_parser": get_gismeteo_parser,
+        "weather_analyzer": get_weather_analyzer,
+        "scheduler_service": get_scheduler_service,
+    }))
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--startup-profile" in sys.argv:
+        startup_profile()
+    else:
+        # Логи пишет фоновый поток, обработчики только кладут записи в очередь
+        log_listener = setup_logging()
+        try:
+            asyncio.run(main(parse_role(sys.argv)))
+        finally:
+            log_listener.stop()
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Chat, Update, User
+
+
+class _ChatSlot:
+    """
+    Очередь апдейтов одного чата: замок и число ожидающих
+    """
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ChatOrderMiddleware(BaseMiddleware):
+    """
+    Апдейты одного чата обрабатываются строго по очереди
+
+    Иначе два быстрых сообщения гоняются за состояние FSM. Разные
+    чаты не ждут друг друга: у каждого своя очередь, и она удаляется,
+    как только в ней никого не осталось
+    """
+
+    def __init__(self) -> None:
+        self._slots: dict[int, _ChatSlot] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @staticmethod
+    def key(data: dict[str, Any]) -> Optional[int]:
+        chat: Optional[Chat] = data.get("event_chat")
+        if chat is not None:
+            return chat.id
+        # Inline-запросы приходят без чата - упорядочиваем по пользователю
+        user: Optional[User] = data.get("event_from_user")
+        return user.id if user is not None else None
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any]
+    ) -> Any:
+        key = self.key(data)
+        if key is None:
+            return await handler(event, data)
+
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _ChatSlot()
+
+        # asyncio.Lock пропускает ожидающих в порядке прихода
+        slot.users += 1
+        try:
+            async with slot.lock:
+                return await handler(event, data)
+        finally:
+            slot.users -= 1
+            if slot.users == 0:
+                del self._slots[key]
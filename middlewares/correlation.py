@@ -0,0 +1,21 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from services.logging_setup import log_context
+
+
+class CorrelationMiddleware(BaseMiddleware):
+    """
+    Помечает все записи лога при обработке апдейта его идентификатором
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any]
+    ) -> Any:
+        with log_context(request_id=str(event.update_id)):
+            return await handler(event, data)
@@ -0,0 +1,113 @@
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message
+
+from config import THROTTLE_BURST, THROTTLE_RATE
+from keyboards import exit_keyboard
+from services.forecast import get_forecast_service
+
+# Флаг обработчика, который ходит к внешним источникам погоды
+UPSTREAM_FLAG = "upstream"
+
+THROTTLE_TEXT = (
+    "Слишком много запросов подряд🙏 "
+    "Подождите немного и повторите, прогноз обновляется не так часто"
+)
+
+
+class TokenBuckets:
+    """
+    Корзины токенов по чатам
+
+    Корзина хранится кортежем (токены, время последнего обновления).
+    Полностью восстановившиеся корзины ничем не отличаются от новых,
+    поэтому периодически удаляются
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        sweep_every: int = 1024
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.sweep_every = sweep_every
+        self._buckets: dict[int, tuple[float, float]] = {}
+        self._calls = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def consume(self, key: int, now: Optional[float] = None) -> bool:
+        """
+        Списать токен; False, если корзина пуста
+        """
+
+        now = time.monotonic() if now is None else now
+
+        self._calls += 1
+        if self._calls >= self.sweep_every:
+            self._calls = 0
+            self.sweep(now)
+
+        tokens, stamp = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return False
+
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+    def sweep(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        self._buckets = {
+            key: (tokens, stamp)
+            for key, (tokens, stamp) in self._buckets.items()
+            if tokens + (now - stamp) * self.rate < self.burst
+        }
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты запросов к источникам погоды по чатам
+
+    Лишние запросы до источников не доходят: отвечаем из кэша,
+    а если там пусто - просим подождать
+    """
+
+    def __init__(
+        self,
+        rate: float = THROTTLE_RATE,
+        burst: int = THROTTLE_BURST
+    ) -> None:
+        self.buckets = TokenBuckets(rate, burst)
+        self.throttled: int = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: dict[str, Any]
+    ) -> Any:
+        if not get_flag(data, UPSTREAM_FLAG):
+            return await handler(event, data)
+
+        if self.buckets.consume(event.chat.id):
+            return await handler(event, data)
+
+        self.throttled += 1
+        forecast_service = get_forecast_service()
+        forecast = forecast_service.cached(event.text) if event.text else None
+        if forecast is not None:
+            await event.reply(forecast_service.render(forecast))
+        else:
+            await event.reply(text=THROTTLE_TEXT, reply_markup=exit_keyboard)
+
+
+# Общий лимит для всех роутеров, которые обращаются к источникам
+upstream_throttling = ThrottlingMiddleware()
@@ -0,0 +1,40 @@
+import asyncio
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+
+from config import PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS, get_config
+from services.profiler import get_profiler, report_to_admin
+
+router = Router()
+
+# Запущенные сеансы профилирования, чтобы задачи не собрал сборщик мусора
+profile_tasks: set[asyncio.Task] = set()
+
+
+def is_admin_chat(message: types.Message) -> bool:
+    """
+    Команды администратора доступны только в чате из настроек
+    """
+
+    return str(message.chat.id) == get_config().chat_id.get_secret_value()
+
+
+@router.message(Command("profile"), is_admin_chat)
+async def cmd_profile(message: types.Message, command: CommandObject) -> None:
+    try:
+        seconds = int(command.args) if command.args else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        await message.answer(f"Формат: /profile [секунды, до {PROFILE_MAX_SECONDS}]")
+        return
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+
+    if get_profiler().active:
+        await message.answer("ℹ️ Профилирование уже идет")
+        return
+
+    # Сеанс идет в фоне, чтобы не задерживать обработку других сообщений
+    task = asyncio.create_task(report_to_admin(message.bot, seconds))
+    profile_tasks.add(task)
+    task.add_done_callback(profile_tasks.discard)
+    await message.answer(f"⏱ Профилирование запущено на {seconds} с")
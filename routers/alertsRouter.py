@@ -0,0 +1,91 @@
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+
+from services.alerts import FIELD_ALIASES, OP_ABOVE, OP_BELOW, get_alert_engine
+from services.city_catalog import city_catalog
+from services.forecast import get_forecast_service
+
+router = Router()
+
+# Сколько оповещений может завести один чат
+MAX_ALERTS_PER_CHAT = 10
+
+OP_ALIASES = {
+    "<": OP_BELOW,
+    "ниже": OP_BELOW,
+    ">": OP_ABOVE,
+    "выше": OP_ABOVE,
+}
+
+ALERT_USAGE = (
+    "Формат: /alert <город> <поле> <ниже|выше> <порог>\n"
+    "Например: /alert Иркутск температура ниже -25\n"
+    "Поля: температура, ветер, влажность, давление"
+)
+
+
+@router.message(Command("alert"))
+async def cmd_alert(message: types.Message, command: CommandObject) -> None:
+    parts = (command.args or "").split()
+    if len(parts) < 4:
+        await message.answer(ALERT_USAGE)
+        return
+
+    *city_parts, field_name, op_name, threshold_text = parts
+    field = FIELD_ALIASES.get(field_name.lower())
+    op = OP_ALIASES.get(op_name.lower())
+    try:
+        threshold = float(threshold_text.replace(",", ".").replace("−", "-"))
+    except ValueError:
+        threshold = None
+
+    if field is None or op is None or threshold is None:
+        await message.answer(ALERT_USAGE)
+        return
+
+    engine = get_alert_engine()
+    if len(engine.rules_for(message.chat.id)) >= MAX_ALERTS_PER_CHAT:
+        await message.answer(
+            f"ℹ️ Можно завести не больше {MAX_ALERTS_PER_CHAT} оповещений. "
+            f"Удалите лишние командой /alert_off"
+        )
+        return
+
+    city_name = " ".join(city_parts)
+    city = city_catalog.find(city_name)
+    rule = engine.add_rule(
+        chat_id=message.chat.id,
+        city_key=get_forecast_service().city_key(city_name),
+        city_name=city.name if city else city_name,
+        field=field,
+        op=op,
+        threshold=threshold
+    )
+    await message.answer(f"✅ Оповещение №{rule.rule_id}: {rule.describe()}")
+
+
+@router.message(Command("alerts"))
+async def cmd_alerts(message: types.Message) -> None:
+    rules = get_alert_engine().rules_for(message.chat.id)
+    if not rules:
+        await message.answer(f"ℹ️ У вас нет оповещений.\n\n{ALERT_USAGE}")
+        return
+
+    lines = [f"№{rule.rule_id}: {rule.describe()}" for rule in rules]
+    await message.answer("🔔 Ваши оповещения:\n" + "\n".join(lines))
+
+
+@router.message(Command("alert_off"))
+async def cmd_alert_off(message: types.Message, command: CommandObject) -> None:
+    try:
+        rule_id = int((command.args or "").strip().lstrip("№"))
+    except ValueError:
+        await message.answer("Формат: /alert_off <номер оповещения>")
+        return
+
+    rule = get_alert_engine().remove_rule(rule_id, message.chat.id)
+    if rule is None:
+        await message.answer("ℹ️ Такого оповещения нет.")
+        return
+
+    await message.answer(f"❌ Оповещение удалено: {rule.describe()}")
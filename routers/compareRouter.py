@@ -0,0 +1,105 @@
+import asyncio
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+
+from config import COMPARE_DEADLINE, COMPARE_MAX_CITIES
+from middlewares.throttling import THROTTLE_TEXT, upstream_throttling
+from services.city_catalog import city_catalog
+from services.forecast import get_forecast_service
+from services.report_renderer import render_comparison
+
+router = Router()
+router.message.middleware(upstream_throttling)
+
+# Самое длинное название города каталога в словах
+MAX_CITY_WORDS = 3
+
+COMPARE_USAGE = (
+    "Формат: /compare <город> <город> ...\n"
+    "Например: /compare Иркутск Москва Нижний Новгород\n"
+    f"Можно сравнить до {COMPARE_MAX_CITIES} городов"
+)
+
+
+def parse_cities(args: str) -> list[str]:
+    """
+    Города из аргументов команды
+
+    Через запятую - как есть, иначе по словам с поиском самых длинных
+    названий каталога ("Нижний Новгород" - один город)
+    """
+
+    if "," in args:
+        return [name.strip() for name in args.split(",") if name.strip()]
+
+    words = args.split()
+    cities: list[str] = []
+    index = 0
+    while index < len(words):
+        for size in range(min(MAX_CITY_WORDS, len(words) - index), 0, -1):
+            candidate = " ".join(words[index:index + size])
+            city = city_catalog.find(candidate)
+            if city is not None or size == 1:
+                cities.append(city.name if city else candidate)
+                index += size
+                break
+    return cities
+
+
+# Без флага UPSTREAM_FLAG: один город - одна загрузка, поэтому токены
+# списываются в обработчике за каждый город, которого нет в кэше
+@router.message(Command("compare"))
+async def cmd_compare(message: types.Message, command: CommandObject) -> None:
+    cities = parse_cities(command.args or "")
+
+    # Повторы убираем, сохраняя порядок
+    forecast_service = get_forecast_service()
+    unique: dict[str, str] = {}
+    for city in cities:
+        unique.setdefault(forecast_service.city_key(city), city)
+    cities = list(unique.values())
+
+    if len(cities) < 2:
+        await message.answer(COMPARE_USAGE)
+        return
+    if len(cities) > COMPARE_MAX_CITIES:
+        await message.answer(
+            f"ℹ️ Можно сравнить не больше {COMPARE_MAX_CITIES} городов за раз"
+        )
+        return
+
+    # Города, на загрузку которых не хватило токенов, к источникам не идут
+    tasks: dict[str, asyncio.Future] = {}
+    for city in cities:
+        if (
+            forecast_service.cached(city) is None
+            and not upstream_throttling.buckets.consume(message.chat.id)
+        ):
+            continue
+        tasks[city] = asyncio.ensure_future(forecast_service.get(city))
+
+    if len(tasks) < len(cities):
+        upstream_throttling.throttled += 1
+    if not tasks:
+        await message.answer(THROTTLE_TEXT)
+        return
+
+    # Один общий срок на все города; опоздавшие догружаются в кэш в фоне
+    await asyncio.wait(tasks.values(), timeout=COMPARE_DEADLINE)
+
+    columns = []
+    for city in cities:
+        task = tasks.get(city)
+        forecast = None
+        if task is not None:
+            if task.done() and not task.cancelled() and task.exception() is None:
+                forecast = task.result()
+            else:
+                task.cancel()
+        columns.append((city, forecast.merged_data if forecast else None))
+
+    text = render_comparison(columns)
+    if len(tasks) < len(cities):
+        text += "\n\n⏳ Часть городов не загружена: слишком много запросов подряд"
+    await message.answer(text, parse_mode="HTML")
@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+
+from aiogram import Router, types
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+
+from config import FORECAST_TTL, INLINE_DEADLINE
+from middlewares.throttling import upstream_throttling
+from services.city_catalog import city_catalog
+from services.forecast import Forecast, get_forecast_service
+
+router = Router()
+
+# Сколько городов предлагать в ответе на inline-запрос
+INLINE_RESULTS_LIMIT = 5
+# Время кэширования ответа Telegram, пока прогноз еще загружается
+# или ответ пустой
+INLINE_LOADING_CACHE_TIME = 5
+
+
+def _result_id(*parts: str) -> str:
+    return hashlib.blake2b("|".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _forecast_result(title: str, forecast: Forecast) -> InlineQueryResultArticle:
+    forecast_service = get_forecast_service()
+    merged_data = forecast.merged_data
+    return InlineQueryResultArticle(
+        id=_result_id(forecast.city_key, forecast.digest),
+        title=title,
+        description=(
+            f"{merged_data.get('temperature', '?')}°C, "
+            f"{merged_data.get('overall_condition', '')}"
+        ),
+        input_message_content=InputTextMessageContent(
+            message_text=forecast_service.render(forecast)
+        )
+    )
+
+
+def _loading_result(title: str) -> InlineQueryResultArticle:
+    return InlineQueryResultArticle(
+        id=_result_id(title, "loading"),
+        title=title,
+        description="Прогноз загружается, повторите запрос через пару секунд",
+        input_message_content=InputTextMessageContent(
+            message_text=f"⏳ Прогноз для города {title} еще загружается"
+        )
+    )
+
+
+# Inline-режим: "@bot Иркутск" в любом чате
+@router.inline_query()
+async def inline_weather(inline_query: types.InlineQuery) -> None:
+    query = inline_query.query.strip()
+    if not query:
+        await inline_query.answer([], cache_time=INLINE_LOADING_CACHE_TIME)
+        return
+
+    forecast_service = get_forecast_service()
+    # Кандидаты из каталога по префиксу. Введенный текст вне каталога
+    # (каждое нажатие клавиши - новый запрос) отвечается только из кэша
+    catalog_titles = [city.name for city in city_catalog.search(query, INLINE_RESULTS_LIMIT)]
+    titles = catalog_titles or [query]
+
+    results: list[InlineQueryResultArticle] = []
+    cache_time = FORECAST_TTL
+    for index, title in enumerate(titles):
+        key = forecast_service.city_key(title)
+        entry = forecast_service.cache.get(key)
+
+        if (
+            entry is None and index == 0 and catalog_titles
+            # Загрузки из inline-режима расходуют тот же лимит, что и команды
+            and upstream_throttling.buckets.consume(inline_query.from_user.id)
+        ):
+            # Холодную загрузку ждем только для лучшего кандидата и недолго
+            try:
+                await forecast_service.get_within(title, INLINE_DEADLINE)
+            except asyncio.TimeoutError:
+                pass
+            entry = forecast_service.cache.get(key)
+
+        if entry is None:
+            if index == 0 and catalog_titles:
+                # Прогноз еще грузится - Telegram не должен надолго запоминать ответ
+                results.append(_loading_result(title))
+                cache_time = INLINE_LOADING_CACHE_TIME
+            continue
+
+        if entry.value is not None:
+            results.append(_forecast_result(title, entry.value))
+            cache_time = min(cache_time, int(entry.ttl_left()))
+
+    # Пустой ответ (город не найден) Telegram не должен запоминать надолго
+    if not results:
+        cache_time = INLINE_LOADING_CACHE_TIME
+
+    await inline_query.answer(
+        results,
+        cache_time=max(cache_time, 0),
+        is_personal=False
+    )
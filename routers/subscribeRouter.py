@@ -2,8 +2,8 @@ from aiogram import Router, types
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
-from config import subscribed_users, user_cities
 from routers.weatherRouters import FSMChooseCity
+from services.subscriptions import is_subscribed, unsubscribe
 
 router = Router()
 
@@ -12,7 +12,7 @@ router = Router()
 async def cmd_subscribe(message: types.Message, state: FSMContext) -> None:
     user_id = message.from_user.id
     
-    if user_id in subscribed_users:
+    if is_subscribed(user_id):
         await message.answer("ℹ️ Вы уже подписаны на рассылку.")
         return
     
@@ -31,10 +31,8 @@ async def cmd_subscribe(message: types.Message, state: FSMContext) -> None:
 async def cmd_unsubscribe(message: types.Message) -> None:
     user_id = message.from_user.id
     
-    if user_id in subscribed_users:
-        subscribed_users.discard(user_id)
-        if user_id in user_cities:
-            del user_cities[user_id]
+    if is_subscribed(user_id):
+        unsubscribe(user_id)
         await message.answer("❌ Вы отписались от рассылки погоды.")
     else:
         await message.answer("ℹ️ Вы не были подписаны на рассылку.")
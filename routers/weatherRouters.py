@@ -1,17 +1,34 @@
+import logging
+from typing import Optional
+
 from aiogram import Router, types, F
-from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
 from aiogram.fsm.state import default_state, State, StatesGroup
 
-from config import subscribed_users, user_cities
-from services.analyze_data import weather_analyzer
-from services.weather import weather_service
-from services.parse_gismeteo import gismeteo_parser
+from config import PROGRESSIVE_TIMEOUT
+from middlewares.throttling import UPSTREAM_FLAG, upstream_throttling
+from services.city_catalog import city_catalog
+from services.daily_forecast import get_daily_forecast_service
+from services.forecast import get_forecast_service
+from services.subscriptions import subscribe
 from keyboards import exit_keyboard, main_menu_keyboard
 
+logger = logging.getLogger(__name__)
+
 router = Router()
+# Частые запросы из одного чата отвечаем из кэша, не дергая источники
+router.message.middleware(upstream_throttling)
+
+# Дальше этого расстояния от города каталога местоположение не принимаем
+MAX_LOCATION_DISTANCE_KM = 150
+# Пометка отчета, собранного по первому ответившему источнику
+PRELIMINARY_NOTE = "⏳ Предварительные данные, уточняем по второму источнику..."
+# Пометка, если второй источник так и не подтвердил предварительный отчет
+SINGLE_SOURCE_NOTE = "⚠️ Данные только одного источника"
 
 
 class FSMChooseCity(StatesGroup):
@@ -30,6 +47,22 @@ async def get_weather(message: Message, state: FSMContext) -> None:
     await state.set_state(FSMChooseCity.city_choice_state)
 
 
+@router.message(Command("forecast"), flags={UPSTREAM_FLAG: True})
+async def command_daily_forecast(message: Message, command: CommandObject) -> None:
+    city_name = (command.args or "").strip()
+    if not city_name:
+        await message.answer("Формат: /forecast <город>\nНапример: /forecast Иркутск")
+        return
+
+    daily_service = get_daily_forecast_service()
+    forecast = await daily_service.get(city_name)
+    if forecast is None:
+        await message.reply("Ошибка: неправильный ввод названия, повторите еще раз")
+        return
+
+    await message.reply(daily_service.render(forecast))
+
+
 @router.message(Command("weather"), StateFilter(default_state))
 async def command_get_weather(message: Message, state: FSMContext) -> None:
     await message.answer(
@@ -39,7 +72,32 @@ async def command_get_weather(message: Message, state: FSMContext) -> None:
     await state.set_state(FSMChooseCity.city_choice_state)
 
 
-@router.message(StateFilter(FSMChooseCity.city_choice_state))
+# Пользователь поделился местоположением - берем ближайший город каталога
+@router.message(F.location, flags={UPSTREAM_FLAG: True})
+async def print_weather_by_location(
+    message: types.Message,
+    state: FSMContext
+) -> None:
+    match = city_catalog.nearest(
+        message.location.latitude,
+        message.location.longitude
+    )
+
+    if match is None or match[1] > MAX_LOCATION_DISTANCE_KM:
+        await message.reply(
+            text="Рядом с этой точкой нет известных городов, введите название",
+            reply_markup=exit_keyboard
+        )
+        return
+
+    city, _ = match
+    await send_weather_forecast(message, state, city.name)
+
+
+@router.message(
+    StateFilter(FSMChooseCity.city_choice_state),
+    flags={UPSTREAM_FLAG: True}
+)
 async def print_weather_forecast(
     message: types.Message,
     state: FSMContext
@@ -47,38 +105,105 @@ async def print_weather_forecast(
     # Получаем из сообщения имя города
     city_name = message.text
 
+    if not city_name:
+        await message.reply(
+            text="Введите название города или поделитесь местоположением",
+            reply_markup=exit_keyboard
+        )
+        return
+
+    await send_weather_forecast(message, state, city_name)
+
+
+async def send_weather_forecast(
+    message: types.Message,
+    state: FSMContext,
+    city_name: str
+) -> None:
     # Проверяем, находится ли пользователь в процессе подписки
     user_data = await state.get_data()
     is_subscribing = user_data.get("subscribing", False)
 
-    # Получаем прогноз погоды
-    # weather_text = weather_service.get_weather_forecast(city_name)
-    data1 = weather_service.get_forecast_data(city_name)
-    data2 = gismeteo_parser.get_weather(city_name)
-    merged_data = weather_analyzer.merge_all_data(data1, data2)
-    weather_text = weather_analyzer.print_weather_report(merged_data)
+    if not is_subscribing:
+        await send_progressive_forecast(message, state, city_name)
+        return
+
+    # Получаем прогноз погоды через общий кэш
+    forecast_service = get_forecast_service()
+    forecast = await forecast_service.get(city_name)
+    weather_text = forecast_service.render(forecast) if forecast else None
 
     if weather_text is None:
         await message.reply(
             text="Ошибка: неправильный ввод названия, повторите еще раз",
             reply_markup=exit_keyboard
         )
-    else:
-        if is_subscribing:
-            # Если это подписка - сохраняем пользователя
-            user_id = message.from_user.id
-            subscribed_users.add(user_id)
-            user_cities[user_id] = city_name
-            
+        return
+
+    # Если это подписка - сохраняем пользователя
+    user_id = message.from_user.id
+    subscribe(user_id, city_name)
+    
+    await message.reply(
+        f"✅ Вы успешно подписались на ежедневную рассылку погоды для города {city_name}!\n\n"
+        f"Пример рассылки:\n{weather_text}",
+        reply_markup=main_menu_keyboard
+    )
+    # Сбрасываем флаг подписки
+    await state.update_data(subscribing=False)
+    await state.set_state(default_state)
+
+
+async def send_progressive_forecast(
+    message: types.Message,
+    state: FSMContext,
+    city_name: str
+) -> None:
+    """
+    Ответ первым пришедшим источником с последующей правкой сообщения
+    """
+
+    forecast_service = get_forecast_service()
+    # Предварительный отчет и его текст без пометки
+    sent: Optional[Message] = None
+    sent_text: str = ""
+
+    async for forecast, preliminary in forecast_service.progressive(
+        city_name,
+        PROGRESSIVE_TIMEOUT
+    ):
+        if forecast is None:
+            if sent is not None:
+                # Уже отправленный отчет не заменяем ошибкой
+                await _edit_reply(sent, f"{SINGLE_SOURCE_NOTE}\n\n{sent_text}")
+                await message.answer("Главное меню", reply_markup=main_menu_keyboard)
+                break
             await message.reply(
-                f"✅ Вы успешно подписались на ежедневную рассылку погоды для города {city_name}!\n\n"
-                f"Пример рассылки:\n{weather_text}",
-                reply_markup=main_menu_keyboard
+                text="Ошибка: неправильный ввод названия, повторите еще раз",
+                reply_markup=exit_keyboard
             )
-            # Сбрасываем флаг подписки
-            await state.update_data(subscribing=False)
-        else:
-            # Если просто запрос погоды
+            # Пользователь остается в выборе города
+            return
+
+        weather_text = forecast_service.render(forecast)
+        if preliminary:
+            # Сообщение с обычной клавиатурой Telegram не дает править,
+            # поэтому предварительный отчет уходит без нее
+            sent = await message.reply(f"{PRELIMINARY_NOTE}\n\n{weather_text}")
+            sent_text = weather_text
+        elif sent is None:
             await message.reply(weather_text, reply_markup=main_menu_keyboard)
-        
-        await state.set_state(default_state)
+        else:
+            await _edit_reply(sent, weather_text)
+            # Клавиатура меню - отдельным сообщением
+            await message.answer("Главное меню", reply_markup=main_menu_keyboard)
+
+    await state.set_state(default_state)
+
+
+async def _edit_reply(sent: Message, text: str) -> None:
+    try:
+        await sent.edit_text(text)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            logger.error(f"Не удалось обновить предварительный отчет: {e}")
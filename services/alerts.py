@@ -0,0 +1,280 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from functools import lru_cache
+import logging
+import sqlite3
+import time
+from typing import Optional
+
+from services.forecast import Forecast
+from services.outbox import Outbox, get_outbox, get_outbox_workers
+from services.storage import get_connection
+
+logger = logging.getLogger(__name__)
+
+OP_BELOW = "<"
+OP_ABOVE = ">"
+
+# Поля объединенного отчета, по которым можно ставить оповещения
+ALERT_FIELDS: dict[str, tuple[str, str]] = {
+    "temperature": ("температура", "°C"),
+    "wind_speed": ("ветер", "м/с"),
+    "humidity": ("влажность", "%"),
+    "pressure_mmhg": ("давление", "мм рт. ст."),
+}
+FIELD_ALIASES: dict[str, str] = {
+    "температура": "temperature",
+    "temperature": "temperature",
+    "ветер": "wind_speed",
+    "wind": "wind_speed",
+    "влажность": "humidity",
+    "humidity": "humidity",
+    "давление": "pressure_mmhg",
+    "pressure": "pressure_mmhg",
+}
+
+
+@dataclass(frozen=True)
+class AlertRule:
+    rule_id: int
+    chat_id: int
+    city_key: str
+    city_name: str
+    field: str
+    op: str
+    threshold: float
+
+    def describe(self) -> str:
+        label, unit = ALERT_FIELDS[self.field]
+        direction = "ниже" if self.op == OP_BELOW else "выше"
+        return f"{self.city_name}: {label} {direction} {self.threshold:g} {unit}"
+
+
+class AlertStore:
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS alert_rules (
+                    rule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    city_key TEXT NOT NULL,
+                    city_name TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    op TEXT NOT NULL,
+                    threshold REAL NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+
+    def all(self) -> list[AlertRule]:
+        rows = self.connection.execute(
+            "SELECT rule_id, chat_id, city_key, city_name, field, op, threshold "
+            "FROM alert_rules"
+        ).fetchall()
+        return [AlertRule(*row) for row in rows]
+
+    def add(
+        self,
+        chat_id: int,
+        city_key: str,
+        city_name: str,
+        field: str,
+        op: str,
+        threshold: float
+    ) -> AlertRule:
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO alert_rules "
+                "(chat_id, city_key, city_name, field, op, threshold, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chat_id, city_key, city_name, field, op, threshold, time.time())
+            )
+        return AlertRule(cursor.lastrowid, chat_id, city_key, city_name, field, op, threshold)
+
+    def remove(self, rule_id: int) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM alert_rules WHERE rule_id = ?", (rule_id,))
+
+
+class _ThresholdIndex:
+    """
+    Пороги правил одного города, поля и направления, по возрастанию
+    """
+
+    __slots__ = ("thresholds", "rule_ids")
+
+    def __init__(self) -> None:
+        self.thresholds: list[float] = []
+        self.rule_ids: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.rule_ids)
+
+    def add(self, threshold: float, rule_id: int) -> None:
+        index = bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(index, threshold)
+        self.rule_ids.insert(index, rule_id)
+
+    def remove(self, threshold: float, rule_id: int) -> None:
+        index = bisect_left(self.thresholds, threshold)
+        while self.rule_ids[index] != rule_id:
+            index += 1
+        del self.thresholds[index]
+        del self.rule_ids[index]
+
+    def crossed_down(self, previous: float, current: float) -> list[int]:
+        # Пороги t, для которых previous >= t > current
+        start = bisect_right(self.thresholds, current)
+        end = bisect_right(self.thresholds, previous)
+        return self.rule_ids[start:end]
+
+    def crossed_up(self, previous: float, current: float) -> list[int]:
+        # Пороги t, для которых previous <= t < current
+        start = bisect_left(self.thresholds, previous)
+        end = bisect_left(self.thresholds, current)
+        return self.rule_ids[start:end]
+
+
+class AlertEngine:
+    """
+    Оповещения о переходе погоды через пороги пользователей
+
+    Правила проиндексированы по городу и полю, а пороги отсортированы,
+    поэтому новое показание проверяется двоичным поиском только среди
+    правил своего города. Срабатывают правила, чей порог лежит между
+    предыдущим и новым значением
+    """
+
+    def __init__(self, store: AlertStore, outbox: Outbox) -> None:
+        self.store = store
+        self.outbox = outbox
+        self._rules: dict[int, AlertRule] = {}
+        # (город, поле, направление) -> отсортированные пороги
+        self._index: dict[tuple[str, str, str], _ThresholdIndex] = {}
+        # Поля с правилами для каждого города
+        self._fields: dict[str, dict[str, int]] = {}
+        # Последнее значение поля по городу
+        self._last: dict[tuple[str, str], float] = {}
+        self._names: dict[str, str] = {}
+        self.sent: int = 0
+
+        for rule in store.all():
+            self._index_rule(rule)
+
+    def _index_rule(self, rule: AlertRule) -> None:
+        self._rules[rule.rule_id] = rule
+        self._index.setdefault(
+            (rule.city_key, rule.field, rule.op), _ThresholdIndex()
+        ).add(rule.threshold, rule.rule_id)
+        fields = self._fields.setdefault(rule.city_key, {})
+        fields[rule.field] = fields.get(rule.field, 0) + 1
+        self._names[rule.city_key] = rule.city_name
+
+    def _unindex_rule(self, rule: AlertRule) -> None:
+        del self._rules[rule.rule_id]
+        key = (rule.city_key, rule.field, rule.op)
+        self._index[key].remove(rule.threshold, rule.rule_id)
+        if not self._index[key]:
+            del self._index[key]
+
+        fields = self._fields[rule.city_key]
+        fields[rule.field] -= 1
+        if not fields[rule.field]:
+            del fields[rule.field]
+            self._last.pop((rule.city_key, rule.field), None)
+        if not fields:
+            del self._fields[rule.city_key]
+            self._names.pop(rule.city_key, None)
+
+    def add_rule(
+        self,
+        chat_id: int,
+        city_key: str,
+        city_name: str,
+        field: str,
+        op: str,
+        threshold: float
+    ) -> AlertRule:
+        rule = self.store.add(chat_id, city_key, city_name, field, op, threshold)
+        self._index_rule(rule)
+        return rule
+
+    def remove_rule(self, rule_id: int, chat_id: int) -> Optional[AlertRule]:
+        rule = self._rules.get(rule_id)
+        if rule is None or rule.chat_id != chat_id:
+            return None
+
+        self.store.remove(rule_id)
+        self._unindex_rule(rule)
+        return rule
+
+    def rules_for(self, chat_id: int) -> list[AlertRule]:
+        return sorted(
+            (rule for rule in self._rules.values() if rule.chat_id == chat_id),
+            key=lambda rule: rule.rule_id
+        )
+
+    def cities(self) -> list[str]:
+        """
+        Города, для которых есть правила - их стоит обновлять в фоне
+        """
+
+        return list(self._names.values())
+
+    def observe(self, forecast: Forecast) -> int:
+        """
+        Проверить новый прогноз и поставить сработавшие оповещения в очередь
+        """
+
+        fields = self._fields.get(forecast.city_key)
+        if not fields:
+            return 0
+
+        messages: list[tuple[int, str, Optional[str]]] = []
+        for field in fields:
+            value = forecast.merged_data.get(field)
+            if value is None:
+                continue
+
+            current = float(value)
+            previous = self._last.get((forecast.city_key, field))
+            self._last[(forecast.city_key, field)] = current
+            if previous is None or previous == current:
+                continue
+
+            if current < previous:
+                index = self._index.get((forecast.city_key, field, OP_BELOW))
+                triggered = index.crossed_down(previous, current) if index else []
+            else:
+                index = self._index.get((forecast.city_key, field, OP_ABOVE))
+                triggered = index.crossed_up(previous, current) if index else []
+
+            for rule_id in triggered:
+                rule = self._rules[rule_id]
+                messages.append((
+                    rule.chat_id,
+                    self._format(rule, current),
+                    f"alert:{rule.rule_id}:{int(forecast.fetched_at)}"
+                ))
+
+        if messages:
+            self.outbox.enqueue_many(messages)
+            get_outbox_workers().notify()
+            self.sent += len(messages)
+            logger.info(f"🔔 Оповещений по городу {forecast.city_key}: {len(messages)}")
+        return len(messages)
+
+    @staticmethod
+    def _format(rule: AlertRule, value: float) -> str:
+        _, unit = ALERT_FIELDS[rule.field]
+        return f"🔔 {rule.describe()}\nСейчас: {value:g} {unit}"
+
+
+@lru_cache(maxsize=None)
+def get_alert_engine() -> AlertEngine:
+    """
+    Глобальный движок оповещений
+    """
+
+    return AlertEngine(AlertStore(get_connection()), get_outbox())
@@ -1,15 +1,47 @@
-from datetime import datetime
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import logging
+import math
+import re
+import time
 from typing import Any, Optional
 
+from services.daily import DaySummary
+from services.hourly import FIELDS as HOURLY_FIELDS, HourlySeries, align
+from services.readings_store import ReadingsStore, get_readings_store
+from services.source_weights import (
+    FIELD_TOLERANCES,
+    AdaptiveSourceWeights,
+    get_source_weights
+)
+from services.report_renderer import (
+    DEFAULT_LOCALE,
+    FORMAT_TEXT,
+    report_renderer
+)
+
+logger = logging.getLogger(__name__)
+
 
 class WeatherAnalyzer:
-    def __init__(self) -> None:
-        # Веса источников, какому из них больше доверяем
+    def __init__(
+        self,
+        store: Optional[ReadingsStore] = None,
+        weights: Optional[AdaptiveSourceWeights] = None
+    ) -> None:
+        # История показаний для расчета трендов
+        self.store = store
+        # Веса, обучаемые по отклонению источников от консенсуса
+        self.weights = weights
+        # Веса источников по умолчанию, какому из них больше доверяем
         # Значения [0, 1]
         self.source_weights: dict[str, float] = {
             "source1": 0.5,
             "source2": 0.5
         }
+        # Сколько часов показывать в ближайшем прогнозе
+        self.hourly_window: int = 6
         # Пределы допустимых отклонений для валидации
         self.validation_thresholds: dict[str, float] = {
             "temperature": 5.0,  # +- 5 градусов
@@ -51,7 +83,8 @@ class WeatherAnalyzer:
 
         # Проверка давления
         if "pressure" in data1 and "pressure" in data2:
-            press_diff = abs(data1["pressure"] - int(data2["pressure"]))
+            # Gismeteo отдает давление в мм рт.ст.
+            press_diff = round(abs(data1["pressure"] - int(data2["pressure"]) * 1.333))
             if press_diff > self.validation_thresholds["pressure"]:
                 warnings.append(f"Большое расхождение в давлении: {press_diff} гПа")
 
@@ -77,6 +110,53 @@ class WeatherAnalyzer:
         else:
             return (value1 * weight1 + value2 * weight2) / (weight1 + weight2)
 
+    def _source_weight(self, source: str, field: str) -> float:
+        """
+        Вес источника для поля: обученный, если есть, иначе фиксированный
+        """
+
+        if self.weights is not None:
+            return self.weights.weight(source, field)
+        return self.source_weights[source]
+
+    @staticmethod
+    def _numeric(value: Any) -> Optional[float]:
+        """
+        Число из значения источника (строки вида "3 м/с" тоже)
+        """
+
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, str):
+            match = re.search(r"-?\d+(?:[.,]\d+)?", value)
+            if match:
+                return float(match.group().replace(",", "."))
+        return None
+
+    def _learn_weights(self, city: str, data1: dict, data2: dict) -> None:
+        """
+        Обновление весов источников по новым показаниям
+        """
+
+        if self.weights is None:
+            return
+
+        now = time.time()
+        # Сначала сверяем прошлые прогнозы с текущими данными
+        for field in FIELD_TOLERANCES:
+            value1 = self._numeric(data1.get(field))
+            value2 = self._numeric(data2.get(field))
+            if field == "pressure" and value2 is not None:
+                value2 *= 1.333
+            self.weights.update(city, field, {"source1": value1, "source2": value2}, now)
+
+        # Затем запоминаем новые почасовые прогнозы источников
+        for source, series in self._hourly_series(data1, data2, now).items():
+            for field, column in series.values.items():
+                self.weights.remember(
+                    city, field, source, list(zip(series.timestamps, column)), now
+                )
+
     def merge_temperature_data(self, data1: dict, data2: dict) -> dict:
         """
         Объединение данных о температуре
@@ -93,8 +173,8 @@ class WeatherAnalyzer:
             temp2_value = float(temp2) if isinstance(temp2, str) else temp2
             merged_temp = self._weighted_average(
                 temp1, temp2_value,
-                self.source_weights["source1"],
-                self.source_weights["source2"]
+                self._source_weight("source1", "temperature"),
+                self._source_weight("source2", "temperature")
             )
             temp_data["temperature"] = round(merged_temp, 1)
             temp_data["temperature_source"] = "combined"
@@ -128,8 +208,8 @@ class WeatherAnalyzer:
             humid2_value = int(humid2) if isinstance(humid2, str) else humid2
             merged_humid = self._weighted_average(
                 float(humid1), float(humid2_value),
-                self.source_weights["source1"],
-                self.source_weights["source2"]
+                self._source_weight("source1", "humidity"),
+                self._source_weight("source2", "humidity")
             )
             humidity_data["humidity"] = int(merged_humid)
             humidity_data["humidity_source"] = "combined"
@@ -156,10 +236,11 @@ class WeatherAnalyzer:
         if press1 is not None and press2 is not None:
             # Преобразуем press2 в int, если это строка
             press2_value = int(press2) if isinstance(press2, str) else press2
+            # Gismeteo отдает давление в мм рт.ст.
             merged_press = self._weighted_average(
-                press1, press2_value,
-                self.source_weights["source1"],
-                self.source_weights["source2"]
+                press1, press2_value * 1.333,
+                self._source_weight("source1", "pressure"),
+                self._source_weight("source2", "pressure")
             )
             pressure_data["pressure_hpa"] = round(merged_press)
             pressure_data["pressure_mmhg"] = round(merged_press / 1.333)
@@ -183,15 +264,15 @@ class WeatherAnalyzer:
 
         wind_data: dict = {}
 
-        wind1 = data1.get("wind")
-        wind2 = data2.get("wind")
+        # Gismeteo отдает ветер текстом, например "3 м/с"
+        wind1 = self._numeric(data1.get("wind"))
+        wind2 = self._numeric(data2.get("wind"))
 
-        if wind1 is not '' and wind2 is not '':
-            wind2_float = float(wind2) if isinstance(wind2, (int, float, str)) else 0.0
+        if wind1 is not None and wind2 is not None:
             merged_wind = self._weighted_average(
-                wind1, wind2_float,
-                self.source_weights["source1"],
-                self.source_weights["source2"]
+                wind1, wind2,
+                self._source_weight("source1", "wind"),
+                self._source_weight("source2", "wind")
             )
             wind_data["wind_speed"] = round(merged_wind, 1)
             wind_data["wind_description"] = self._get_wind_description(merged_wind)
@@ -201,9 +282,8 @@ class WeatherAnalyzer:
             wind_data["wind_description"] = self._get_wind_description(wind1)
             wind_data["wind_source"] = "source1"
         elif wind2 is not None:
-            wind2_float = float(wind2) if isinstance(wind2, (int, float, str)) else 0.0
-            wind_data["wind_speed"] = round(wind2_float, 1)
-            wind_data["wind_description"] = self._get_wind_description(wind2_float)
+            wind_data["wind_speed"] = round(wind2, 1)
+            wind_data["wind_description"] = self._get_wind_description(wind2)
             wind_data["wind_source"] = "source2"
 
         # Направление ветра, если есть
@@ -322,6 +402,8 @@ class WeatherAnalyzer:
                     # Преобразуем значения к числам
                     val1_num = float(val1) if isinstance(val1, (int, float, str)) else None
                     val2_num = float(val2) if isinstance(val2, (int, float, str)) else None
+                    if field == "pressure" and val2_num is not None:
+                        val2_num *= 1.333
                     if val1_num is not None and val2_num is not None:
                         diff = abs(val1_num - val2_num)
                         # Пороги для разных полей
@@ -337,10 +419,21 @@ class WeatherAnalyzer:
                     pass
         if total_fields > 0:
             match_ratio = matching_fields / total_fields
-            score = 0.3 + 0.7 * match_ratio
+            score = 0.3 + 0.7 * match_ratio * self._data_quality()
 
         return round(score, 2)
 
+    def _data_quality(self) -> float:
+        """
+        Среднее качество источников по полям с учетом обученных весов
+        """
+
+        if self.weights is None:
+            return 1.0
+        return sum(
+            self.weights.reliability(field) for field in FIELD_TOLERANCES
+        ) / len(FIELD_TOLERANCES)
+
     def _determine_overall_condition(self, data: dict) -> str:
         """
         Определение общего состояния погоды
@@ -436,13 +529,184 @@ class WeatherAnalyzer:
 
         return recommendations
 
-    def merge_all_data(self, data1: dict, data2: dict) -> dict:
+    def _record_readings(self, city: str, data1: dict, data2: dict, merged_data: dict) -> None:
+        """
+        Сохранение показаний источников и объединенных данных в историю
+        """
+
+        if self.store is None:
+            return
+
+        readings: list[tuple[str, dict]] = []
+        if data1:
+            readings.append(("source1", data1))
+        if data2:
+            reading = dict(data2)
+            # Gismeteo отдает давление в мм рт.ст., в истории храним гПа
+            if reading.get("pressure") is not None:
+                try:
+                    reading["pressure"] = float(reading["pressure"]) * 1.333
+                except (TypeError, ValueError):
+                    reading["pressure"] = None
+            readings.append(("source2", reading))
+        readings.append(("combined", {
+            "temperature": merged_data.get("temperature"),
+            "humidity": merged_data.get("humidity"),
+            "pressure": merged_data.get("pressure_hpa"),
+            "wind": merged_data.get("wind_speed"),
+        }))
+        self.store.append_many(city, readings)
+
+    def _trend_data(self, city: str, temperature: Optional[float]) -> dict:
+        """
+        Изменение температуры за сутки и тренд за последние часы по истории
+        """
+
+        trend_data: dict = {}
+        if self.store is None or temperature is None:
+            return trend_data
+
+        now = time.time()
+
+        # Ближайшее к "сутки назад" показание в окне +-2 часа
+        day_ago = now - 24 * 3600
+        timestamps, values = self.store.column(
+            city, "temperature", day_ago - 2 * 3600, day_ago + 2 * 3600
+        )
+        if values:
+            closest = min(
+                range(len(values)),
+                key=lambda index: abs(timestamps[index] - day_ago)
+            )
+            trend_data["temperature_delta_24h"] = round(temperature - values[closest], 1)
+
+        # Наклон линии тренда (МНК) за последние 6 часов, °C в час
+        timestamps, values = self.store.column(
+            city, "temperature", now - 6 * 3600, now
+        )
+        if len(values) >= 3:
+            hours = [(timestamp - now) / 3600 for timestamp in timestamps]
+            mean_x = sum(hours) / len(hours)
+            mean_y = sum(values) / len(values)
+            variance = sum((x - mean_x) ** 2 for x in hours)
+            if variance > 0:
+                slope = sum(
+                    (x - mean_x) * (y - mean_y)
+                    for x, y in zip(hours, values)
+                ) / variance
+                trend_data["temperature_trend"] = round(slope, 2)
+
+        return trend_data
+
+    def _hourly_outlook(self, data1: dict, data2: dict) -> list[dict]:
+        """
+        Почасовой прогноз обоих источников на общей сетке, только нужное окно
+        """
+
+        now = time.time()
+        series = self._hourly_series(data1, data2, now)
+        if not series:
+            return []
+
+        aligned = align(series, self._source_weight, now, self.hourly_window)
+        return list(aligned.window(now, self.hourly_window))
+
+    @staticmethod
+    def _hourly_series(data1: dict, data2: dict, now: float) -> dict[str, HourlySeries]:
+        """
+        Почасовые ряды источников, у которых они есть
+        """
+
+        utc_offset = data1.get("timezone", 0)
+        series: dict[str, HourlySeries] = {}
+
+        hourly1 = data1.get("hourly")
+        if isinstance(hourly1, HourlySeries) and len(hourly1):
+            series["source1"] = hourly1
+            utc_offset = hourly1.utc_offset
+
+        hourly2 = data2.get("hourly_forecast")
+        if isinstance(hourly2, dict) and hourly2.get("times"):
+            values = {
+                field: hourly2[field]
+                for field in HOURLY_FIELDS
+                if field in hourly2
+            }
+            hourly2_series = HourlySeries.from_labels(
+                hourly2["times"], values, utc_offset, now
+            )
+            if len(hourly2_series):
+                series["source2"] = hourly2_series
+
+        return series
+
+    def merge_daily(
+        self,
+        days: list[DaySummary],
+        utc_offset: int,
+        data2: Optional[dict] = None
+    ) -> dict:
+        """
+        Прогноз по дням: сводка OpenWeatherMap, уточненная почасовыми
+        температурами Gismeteo там, где они есть
+        """
+
+        now = time.time()
+        merged_days = [asdict(day) for day in days]
+        data_sources = 1
+
+        hourly2 = (data2 or {}).get("hourly_forecast")
+        if isinstance(hourly2, dict) and hourly2.get("times") and "temperature" in hourly2:
+            series = HourlySeries.from_labels(
+                hourly2["times"],
+                {"temperature": hourly2["temperature"]},
+                utc_offset,
+                now
+            )
+            tz = timezone(timedelta(seconds=utc_offset))
+            by_date: dict[str, list[float]] = {}
+            for timestamp, value in zip(series.timestamps, series.values["temperature"]):
+                if not math.isnan(value):
+                    date = datetime.fromtimestamp(timestamp, tz).strftime("%Y-%m-%d")
+                    by_date.setdefault(date, []).append(value)
+
+            weight1 = self._source_weight("source1", "temperature")
+            weight2 = self._source_weight("source2", "temperature")
+
+            def blend(value1: float, value2: float) -> float:
+                return (weight1 * value1 + weight2 * value2) / (weight1 + weight2)
+
+            for day in merged_days:
+                values = by_date.get(day["date"])
+                if not values:
+                    continue
+                # Gismeteo покрывает только часть суток, поэтому может лишь
+                # расширить диапазон OpenWeatherMap с учетом весов источников
+                day["temp_min"] = round(min(day["temp_min"], blend(day["temp_min"], min(values))), 1)
+                day["temp_max"] = round(max(day["temp_max"], blend(day["temp_max"], max(values))), 1)
+                data_sources = 2
+
+        return {"days": merged_days, "data_sources": data_sources}
+
+    def merge_all_data(
+        self,
+        data1: dict,
+        data2: dict,
+        record: bool = True,
+        history_key: Optional[str] = None
+    ) -> dict:
         """
         Объединение всех данных из двух источников
+
+        record=False - не записывать показания в историю и не обучать веса
+        history_key - ключ города в истории (ключ каталога); без него
+        история ведется по названию из ответа источника, а если его
+        нет - не ведется вовсе
         """
 
-        print(data1)
-        print(data2)
+        # Сырые данные источников - отладочные записи, пишутся выборочно
+        logger.debug("Данные источника 1: %s", data1)
+        logger.debug("Данные источника 2: %s", data2)
 
         merged_data: dict = {}
 
@@ -485,11 +749,21 @@ class WeatherAnalyzer:
                 else:
                     merged_data["geomagnetic_description"] = "сильная"
 
-        # Ближайший прогноз
-        if "next_hours" in data1:
-            merged_data["next_hours"] = data1["next_hours"]
-        elif "next_hours" in data2:
-            merged_data["next_hours"] = data2["next_hours"]
+        # Ближайший прогноз по часам
+        next_hours = self._hourly_outlook(data1, data2)
+        if next_hours:
+            merged_data["next_hours"] = next_hours
+
+        # Тренды по локальной истории показаний. Название по умолчанию
+        # только для отображения - в историю чужого города оно не пишет
+        history_key = history_key or data1.get("city_name")
+        if history_key:
+            merged_data.update(
+                self._trend_data(history_key, merged_data.get("temperature"))
+            )
+            if record:
+                self._record_readings(history_key, data1, data2, merged_data)
+                self._learn_weights(history_key, data1, data2)
 
         # Рассчитываем уровень доверия
         merged_data["confidence_score"] = self.calculate_confidence_score(data1, data2)
@@ -505,79 +779,36 @@ class WeatherAnalyzer:
 
         return merged_data
 
-    def print_weather_report(self, merged_data: dict) -> str:
+    def print_weather_report(
+        self,
+        merged_data: dict,
+        locale: str = DEFAULT_LOCALE,
+        fmt: str = FORMAT_TEXT,
+        digest: Optional[str] = None
+    ) -> str:
         """
         Красивый вывод отчета о погоде
         """
-        print(merged_data)
-
-        result_str: str = ""
-
-        result_str += f"ПОГОДНЫЙ ОТЧЕТ: {merged_data.get('city_name', 'Неизвестный город')}\n"
-
-        result_str += f"\n📊 ОБЩАЯ ИНФОРМАЦИЯ:\n"
-        result_str += f"   • Состояние: {merged_data.get('overall_condition', 'нет данных')}\n"
-        result_str += f"   • Уровень доверия: {merged_data.get('confidence_score', 0) * 100:.0f}%\n"
-        result_str += f"   • Источников данных: {merged_data.get('data_sources', 0)}\n"
-
-        result_str += f"\n🌡 ТЕМПЕРАТУРА:\n"
-        temp = merged_data.get("temperature")
-        if temp:
-            result_str += f"   • Воздух: {temp}°C\n"
 
-        feels_like = merged_data.get("feels_like")
-        if feels_like:
-            result_str += f"   • По ощущению: {feels_like}°C\n"
+        return report_renderer.render(
+            merged_data,
+            locale=locale,
+            fmt=fmt,
+            digest=digest
+        )
 
-        water_temp = merged_data.get("water_temperature")
-        if water_temp:
-            result_str += f"   • Вода: {water_temp}°C\n"
 
-        result_str += f"\n💨 ВЕТЕР И ВЛАЖНОСТЬ:\n"
-        if "wind_speed" in merged_data:
-            result_str += f"   • Скорость: {merged_data.get('wind_speed', 0)} м/с ({merged_data.get('wind_description', 'нет данных')})\n"
-
-        if "humidity" in merged_data:
-            result_str += f"   • Влажность: {merged_data.get('humidity')}%\n"
-
-        result_str += f"\n📈 АТМОСФЕРНОЕ ДАВЛЕНИЕ:\n"
-        if "pressure_hpa" in merged_data:
-            result_str += f"   • {merged_data.get('pressure_hpa')} гПа ({merged_data.get('pressure_mmhg', '?')} мм рт.ст.)\n"
-
-        result_str += f"\n☀ СОЛНЕЧНЫЕ ЧАСЫ:\n"
-        if "sunrise" in merged_data:
-            result_str += f"   • Восход: {merged_data.get('sunrise')}\n"
-            result_str += f"   • Закат: {merged_data.get('sunset')}\n"
-            if "day_length" in merged_data:
-                result_str += f"   • Продолжительность дня: {merged_data.get('day_length')}\n"
-
-        if "geomagnetic_activity" in merged_data:
-            result_str += f"\n⚡ ГЕОМАГНИТНАЯ АКТИВНОСТЬ:\n"
-            result_str += f"   • Уровень: {merged_data.get('geomagnetic_activity')}/9 баллов\n"
-            result_str += f"   • Описание: {merged_data.get('geomagnetic_description', 'нет данных')}\n"
-
-        if "next_hours" in merged_data:
-            result_str += f"\n⏰ БЛИЖАЙШИЙ ПРОГНОЗ:\n"
-            next_hours = merged_data["next_hours"]
-            if isinstance(next_hours, list):
-                result_str += f"   • Часы: {', '.join(str(h) for h in next_hours[:5])}\n"
-            else:
-                result_str += f"   • Прогноз: {next_hours}\n"
-
-        if "warnings" in merged_data and merged_data["warnings"]:
-            result_str += f"\n⚠ ПРЕДУПРЕЖДЕНИЯ:\n"
-            for warning in merged_data["warnings"]:
-                result_str += f"   • {warning}\n"
-
-        result_str += f"\n🎯 РЕКОМЕНДАЦИИ:\n"
-        recommendations = merged_data.get("recommendations", {})
-        if recommendations:
-            for key, value in recommendations.items():
-                result_str += f"   • {key.replace('_', ' ').title()}: {value}\n"
-        else:
-            result_str += "   • Нет специальных рекомендаций\n"
+@lru_cache(maxsize=None)
+def get_weather_analyzer() -> WeatherAnalyzer:
+    """
+    Глобальный экземпляр анализатора
+    """
 
-        return result_str
+    return WeatherAnalyzer(get_readings_store(), get_source_weights())
 
 
-weather_analyzer = WeatherAnalyzer()
+def __getattr__(name: str):
+    # Глобальный экземпляр создается лениво, при первом обращении
+    if name == "weather_analyzer":
+        return get_weather_analyzer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+BROADCAST_GREETING = "🌅 Доброе утро! Ваша ежедневная рассылка погоды:\n\n"
+BROADCAST_FOOTER = "\n\n💡 Чтобы отписаться: /unsubscribe"
+
+
+@dataclass
+class BroadcastPayload:
+    city: str
+    window: str
+    text: str
+    # Удалось ли получить погоду для города
+    ok: bool
+    # Сколько отправок обслужил этот payload
+    sends: int = 0
+
+
+def format_broadcast_text(city: str, weather_text: Optional[str]) -> str:
+    """
+    Итоговый текст рассылки с приветствием и подсказкой об отписке
+    """
+
+    if weather_text:
+        return f"{BROADCAST_GREETING}{weather_text}{BROADCAST_FOOTER}"
+
+    return (
+        f"❌ Не удалось получить погоду для города {city}."
+        "Проверьте правильность названия.\n"
+        f"Используйте /subscribe чтобы изменить город."
+    )
+
+
+class BroadcastCache:
+    def __init__(self, max_windows: int = 2) -> None:
+        # окно рассылки -> (город -> готовый payload)
+        self._windows: OrderedDict[str, dict[str, BroadcastPayload]] = OrderedDict()
+        self.max_windows = max_windows
+
+    @staticmethod
+    def _city_key(city: str) -> str:
+        return city.strip().lower()
+
+    def get(self, city: str, window: str) -> Optional[BroadcastPayload]:
+        return self._windows.get(window, {}).get(self._city_key(city))
+
+    async def get_or_build(
+        self,
+        city: str,
+        window: str,
+        build: Callable[[], Awaitable[Optional[str]]]
+    ) -> BroadcastPayload:
+        """
+        Получить готовый payload для города, отрисовав его один раз за окно
+        """
+
+        payload = self.get(city, window)
+        if payload is not None:
+            return payload
+
+        weather_text = await build()
+        payload = BroadcastPayload(
+            city=city,
+            window=window,
+            text=format_broadcast_text(city, weather_text),
+            ok=bool(weather_text)
+        )
+
+        payloads = self._windows.setdefault(window, {})
+        self._windows.move_to_end(window)
+        payloads[self._city_key(city)] = payload
+
+        # Старые окна рассылки больше не нужны
+        while len(self._windows) > self.max_windows:
+            self._windows.popitem(last=False)
+
+        return payload
+
+    def record_send(self, payload: BroadcastPayload) -> None:
+        payload.sends += 1
+
+    def stats(self, window: Optional[str] = None) -> dict[str, int]:
+        """
+        Сколько отправок обслужил каждый payload окна (по умолчанию последнего)
+        """
+
+        if window is None:
+            if not self._windows:
+                return {}
+            window = next(reversed(self._windows))
+
+        return {
+            payload.city: payload.sends
+            for payload in self._windows.get(window, {}).values()
+        }
+
+
+# Глобальный кэш готовых сообщений рассылки
+broadcast_cache = BroadcastCache()
@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from functools import lru_cache
+import sqlite3
+import time
+from typing import Iterable, Mapping, Optional
+import uuid
+
+from services.storage import get_connection
+
+
+@dataclass(frozen=True)
+class BroadcastRun:
+    run_id: str
+    window: str
+    status: str
+
+
+class BroadcastJournal:
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS broadcast_runs (
+                    run_id TEXT PRIMARY KEY,
+                    window TEXT NOT NULL UNIQUE,
+                    status TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    finished_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS broadcast_recipients (
+                    run_id TEXT NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    city TEXT NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (run_id, chat_id)
+                );
+            """)
+
+    def get_run(self, window: str) -> Optional[BroadcastRun]:
+        row = self.connection.execute(
+            "SELECT run_id, window, status FROM broadcast_runs WHERE window = ?",
+            (window,)
+        ).fetchone()
+        return BroadcastRun(*row) if row else None
+
+    def start_run(self, window: str, by_city: Mapping[str, Iterable[int]]) -> BroadcastRun:
+        """
+        Новый запуск рассылки со снимком получателей: город -> чаты
+        """
+
+        run = BroadcastRun(run_id=uuid.uuid4().hex, window=window, status="running")
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO broadcast_runs (run_id, window, status, started_at) "
+                "VALUES (?, ?, ?, ?)",
+                (run.run_id, run.window, run.status, time.time())
+            )
+            self.connection.executemany(
+                "INSERT INTO broadcast_recipients (run_id, chat_id, city) VALUES (?, ?, ?)",
+                [
+                    (run.run_id, chat_id, city)
+                    for city, chat_ids in by_city.items()
+                    for chat_id in chat_ids
+                ]
+            )
+        return run
+
+    def unfinished(self) -> Optional[BroadcastRun]:
+        row = self.connection.execute(
+            "SELECT run_id, window, status FROM broadcast_runs "
+            "WHERE status = 'running' ORDER BY started_at DESC LIMIT 1"
+        ).fetchone()
+        return BroadcastRun(*row) if row else None
+
+    def pending(self, run_id: str) -> dict[str, list[int]]:
+        """
+        Получатели, до которых запуск еще не дошел: город -> чаты
+        """
+
+        by_city: dict[str, list[int]] = {}
+        for chat_id, city in self.connection.execute(
+            "SELECT chat_id, city FROM broadcast_recipients "
+            "WHERE run_id = ? AND done = 0 ORDER BY city, chat_id",
+            (run_id,)
+        ):
+            by_city.setdefault(city, []).append(chat_id)
+        return by_city
+
+    def checkpoint(self, run_id: str, chat_ids: list[int]) -> None:
+        """
+        Отметить пачку обработанных получателей одной транзакцией
+        """
+
+        if not chat_ids:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE broadcast_recipients SET done = 1 WHERE run_id = ? AND chat_id = ?",
+                [(run_id, chat_id) for chat_id in chat_ids]
+            )
+
+    def finish(self, run_id: str) -> None:
+        with self.connection:
+            self.connection.execute(
+                "UPDATE broadcast_runs SET status = 'finished', finished_at = ? WHERE run_id = ?",
+                (time.time(), run_id)
+            )
+
+
+@lru_cache(maxsize=None)
+def get_broadcast_journal() -> BroadcastJournal:
+    """
+    Глобальный журнал запусков рассылки
+    """
+
+    return BroadcastJournal(get_connection())
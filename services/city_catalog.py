@@ -0,0 +1,104 @@
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Optional
+
+from services.spatial_index import KDTree
+
+
+@dataclass(frozen=True)
+class City:
+    name: str
+    latitude: float
+    longitude: float
+    # Идентификатор страницы города на Gismeteo, если известен
+    gismeteo_slug: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return normalize_city_name(self.name)
+
+
+def normalize_city_name(name: str) -> str:
+    """
+    Нормализованное имя города - ключ каталога и кэшей
+    """
+
+    return " ".join(name.strip().lower().replace("ё", "е").split())
+
+
+# Локальный каталог известных городов
+CITIES: tuple[City, ...] = (
+    City("Иркутск", 52.2978, 104.2964, "irkutsk-4787"),
+    City("Москва", 55.7558, 37.6173, "moscow-4368"),
+    City("Санкт-Петербург", 59.9343, 30.3351, "sankt-peterburg-4079"),
+    City("Новосибирск", 55.0084, 82.9357, "novosibirsk-4690"),
+    City("Екатеринбург", 56.8389, 60.6057, "yekaterinburg-4517"),
+    City("Ангарск", 52.5448, 103.8885),
+    City("Шелехов", 52.2106, 104.0972),
+    City("Братск", 56.1514, 101.6342),
+    City("Улан-Удэ", 51.8335, 107.5841),
+    City("Чита", 52.0340, 113.4994),
+    City("Красноярск", 56.0153, 92.8932),
+    City("Томск", 56.4846, 84.9476),
+    City("Омск", 54.9885, 73.3242),
+    City("Хабаровск", 48.4802, 135.0719),
+    City("Владивосток", 43.1155, 131.8855),
+    City("Казань", 55.7887, 49.1221),
+    City("Нижний Новгород", 56.2965, 43.9361),
+    City("Самара", 53.1959, 50.1002),
+    City("Ростов-на-Дону", 47.2357, 39.7015),
+    City("Сочи", 43.5855, 39.7231),
+)
+
+
+class CityCatalog:
+    def __init__(self, cities: tuple[City, ...] = CITIES) -> None:
+        self._by_key: dict[str, City] = {city.key: city for city in cities}
+        # Отсортированные ключи для поиска по префиксу
+        self._keys: list[str] = sorted(self._by_key)
+        # Пространственный индекс строится при первом запросе по координатам
+        self._index: Optional[KDTree[City]] = None
+
+    def __iter__(self):
+        return iter(self._by_key.values())
+
+    def find(self, name: str) -> Optional[City]:
+        return self._by_key.get(normalize_city_name(name))
+
+    def search(self, prefix: str, limit: int = 5) -> list[City]:
+        """
+        Города, название которых начинается с prefix
+        """
+
+        prefix = normalize_city_name(prefix)
+        if not prefix:
+            return []
+
+        result: list[City] = []
+        index = bisect_left(self._keys, prefix)
+        while index < len(self._keys) and len(result) < limit:
+            key = self._keys[index]
+            if not key.startswith(prefix):
+                break
+            result.append(self._by_key[key])
+            index += 1
+        return result
+
+    def nearest(self, latitude: float, longitude: float) -> Optional[tuple[City, float]]:
+        """
+        Ближайший к точке город каталога и расстояние до него в километрах
+        """
+
+        return self.build_index().nearest(latitude, longitude)
+
+    def build_index(self) -> KDTree[City]:
+        if self._index is None:
+            self._index = KDTree([
+                (city.latitude, city.longitude, city)
+                for city in self._by_key.values()
+            ])
+        return self._index
+
+
+# Глобальный каталог городов
+city_catalog = CityCatalog()
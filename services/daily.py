@@ -0,0 +1,111 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from services.hourly import HOUR
+
+DAY = 24 * HOUR
+
+
+@dataclass(frozen=True)
+class DaySummary:
+    # Местная дата дня
+    date: str
+    weekday: int
+    temp_min: float
+    temp_max: float
+    # Сумма осадков за день, мм
+    precipitation: float
+    # Наибольшая вероятность осадков за день, 0..1
+    pop: float
+    # Преобладающее состояние (код OpenWeatherMap)
+    condition: str
+
+
+class ThreeHourlySeries:
+    """
+    Прогноз на 5 дней с шагом 3 часа в компактных массивах
+    """
+
+    __slots__ = (
+        "utc_offset", "timestamps", "temp_min", "temp_max",
+        "precipitation", "pop", "conditions",
+    )
+
+    def __init__(self, utc_offset: int = 0) -> None:
+        self.utc_offset = utc_offset
+        self.timestamps = array("d")
+        self.temp_min = array("f")
+        self.temp_max = array("f")
+        self.precipitation = array("f")
+        self.pop = array("f")
+        self.conditions: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_owm(cls, payload: dict[str, Any]) -> "ThreeHourlySeries":
+        """
+        Ряд из ответа OpenWeatherMap /forecast
+        """
+
+        series = cls(utc_offset=payload.get("city", {}).get("timezone", 0))
+        for item in sorted(payload.get("list", []), key=lambda item: item["dt"]):
+            main = item.get("main", {})
+            temperature = main.get("temp")
+            series.timestamps.append(float(item["dt"]))
+            series.temp_min.append(main.get("temp_min", temperature))
+            series.temp_max.append(main.get("temp_max", temperature))
+            # Дождь и снег за 3 часа, мм
+            series.precipitation.append(
+                item.get("rain", {}).get("3h", 0.0) + item.get("snow", {}).get("3h", 0.0)
+            )
+            series.pop.append(item.get("pop", 0.0))
+            weather = item.get("weather") or [{}]
+            series.conditions.append(weather[0].get("main", ""))
+        return series
+
+    def day_bounds(self) -> list[tuple[int, int, int]]:
+        """
+        Границы местных суток в ряду: (номер дня, начало, конец)
+        """
+
+        if not self.timestamps:
+            return []
+
+        # Ряд отсортирован, поэтому границы суток находятся двоичным поиском
+        first_day = int((self.timestamps[0] + self.utc_offset) // DAY)
+        last_day = int((self.timestamps[-1] + self.utc_offset) // DAY)
+
+        bounds: list[tuple[int, int, int]] = []
+        for day in range(first_day, last_day + 1):
+            start = bisect_left(self.timestamps, day * DAY - self.utc_offset)
+            end = bisect_left(self.timestamps, (day + 1) * DAY - self.utc_offset)
+            if start < end:
+                bounds.append((day, start, end))
+        return bounds
+
+    def days(self) -> list[DaySummary]:
+        """
+        Свертка ряда по местным суткам: минимум, максимум и сумма осадков
+        """
+
+        tz = timezone(timedelta(seconds=self.utc_offset))
+        summaries: list[DaySummary] = []
+        for day, start, end in self.day_bounds():
+            # Срезы массивов сворачиваются встроенными min/max/sum без цикла в Python
+            date = datetime.fromtimestamp(day * DAY, timezone.utc).replace(tzinfo=tz)
+            summaries.append(DaySummary(
+                date=date.strftime("%Y-%m-%d"),
+                weekday=date.weekday(),
+                temp_min=round(min(self.temp_min[start:end]), 1),
+                temp_max=round(max(self.temp_max[start:end]), 1),
+                precipitation=round(sum(self.precipitation[start:end]), 1),
+                pop=round(max(self.pop[start:end]), 2),
+                condition=Counter(self.conditions[start:end]).most_common(1)[0][0]
+            ))
+        return summaries
@@ -0,0 +1,120 @@
+import asyncio
+from dataclasses import dataclass
+from functools import lru_cache
+import logging
+import time
+from typing import Optional
+
+from config import DAILY_FORECAST_TTL, FORECAST_NEGATIVE_TTL
+from services.analyze_data import get_weather_analyzer
+from services.city_catalog import city_catalog, normalize_city_name
+from services.forecast_cache import ForecastCache
+from services.parse_gismeteo import PROVIDER as GISMETEO, get_gismeteo_parser
+from services.quota import to_thread
+from services.report_renderer import (
+    DEFAULT_LOCALE,
+    FORMAT_TEXT,
+    REPORT_DAILY,
+    report_digest,
+    report_renderer
+)
+from services.weather import PROVIDER as OPENWEATHERMAP, get_weather_service
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DailyForecast:
+    city_key: str
+    city_name: str
+    merged_data: dict
+    fetched_at: float
+    # Ключ версии данных для мемоизации отчета
+    digest: str
+
+
+class DailyForecastService:
+    """
+    Прогноз на несколько дней с общим кэшем и одной загрузкой на город
+    """
+
+    def __init__(self, cache: ForecastCache) -> None:
+        self.cache = cache
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def get(self, city_name: str) -> Optional[DailyForecast]:
+        city = city_catalog.find(city_name)
+        key = city.key if city else normalize_city_name(city_name)
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry.value
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, city_name))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, city_name: str) -> Optional[DailyForecast]:
+        city = city_catalog.find(city_name)
+        query = city.name if city else city_name
+        coordinates = (city.latitude, city.longitude) if city else None
+
+        weather_service = get_weather_service()
+        loads = [
+            to_thread({OPENWEATHERMAP: 1}, weather_service.get_daily_forecast, query, coordinates)
+        ]
+        # Почасовые данные Gismeteo - только со страницы этого же города
+        gismeteo_parser = get_gismeteo_parser()
+        if gismeteo_parser.has_page(query):
+            loads.append(to_thread({GISMETEO: 1}, gismeteo_parser.get_weather, query))
+        series, *rest = await asyncio.gather(*loads)
+        data2 = rest[0] if rest else None
+
+        if series is None:
+            self.cache.set(key, None, FORECAST_NEGATIVE_TTL)
+            return None
+
+        try:
+            merged_data = get_weather_analyzer().merge_daily(
+                series.days(), series.utc_offset, data2
+            )
+        except Exception as e:
+            logger.error(f"Ошибка сводки по дням для {city_name}: {e}")
+            return None
+
+        merged_data["city_name"] = query
+        forecast = DailyForecast(
+            city_key=key,
+            city_name=query,
+            merged_data=merged_data,
+            fetched_at=time.time(),
+            digest=report_digest(merged_data)
+        )
+        self.cache.set(key, forecast, DAILY_FORECAST_TTL)
+        return forecast
+
+    def render(
+        self,
+        forecast: DailyForecast,
+        locale: str = DEFAULT_LOCALE,
+        fmt: str = FORMAT_TEXT
+    ) -> str:
+        return report_renderer.render(
+            forecast.merged_data,
+            locale=locale,
+            fmt=fmt,
+            digest=forecast.digest,
+            kind=REPORT_DAILY
+        )
+
+
+@lru_cache(maxsize=None)
+def get_daily_forecast_service() -> DailyForecastService:
+    """
+    Глобальный сервис прогнозов по дням
+    """
+
+    return DailyForecastService(ForecastCache(max_entries=256))
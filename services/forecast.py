@@ -0,0 +1,353 @@
+import asyncio
+from dataclasses import dataclass
+from functools import lru_cache
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Optional
+
+from config import FORECAST_GRACE, FORECAST_NEGATIVE_TTL, FORECAST_TTL, REFRESH_TOP_K
+from services.analyze_data import get_weather_analyzer
+from services.city_catalog import city_catalog, normalize_city_name
+from services.forecast_cache import CacheEntry, ForecastCache
+from services.gismeteo_crawler import get_gismeteo_crawler
+from services.logging_setup import city_var
+from services.parse_gismeteo import PROVIDER as GISMETEO, get_gismeteo_parser
+from services.popularity import PopularityTracker
+from services.quota import (
+    PRIORITY_PREFETCH,
+    Urgency,
+    get_quota,
+    priority,
+    to_thread,
+    upstream_priority,
+    upstream_urgency
+)
+from services.report_renderer import DEFAULT_LOCALE, FORMAT_TEXT, report_digest
+from services.weather import FORECAST_DATA_REQUESTS, PROVIDER as OPENWEATHERMAP, get_weather_service
+
+logger = logging.getLogger(__name__)
+
+# Метка "данные Gismeteo загрузить самим"
+_FETCH = object()
+
+
+@dataclass(frozen=True)
+class Forecast:
+    city_key: str
+    merged_data: dict
+    # Дайджест объединенных данных - версия для мемоизации отрисовки
+    digest: str
+    fetched_at: float
+
+
+class ForecastService:
+    def __init__(self, cache: ForecastCache, popularity: PopularityTracker) -> None:
+        self.cache = cache
+        self.popularity = popularity
+        # Подписчики на каждый новый загруженный прогноз
+        self.listeners: list[Callable[[Forecast], None]] = []
+        # Загрузки в процессе: один запрос к источникам на город
+        self._inflight: dict[str, asyncio.Task] = {}
+        # Предварительные отчеты идущих загрузок
+        self._partials: dict[str, asyncio.Future] = {}
+        # Приоритеты идущих загрузок у источников
+        self._urgencies: dict[str, Urgency] = {}
+
+    def city_key(self, city_name: str) -> str:
+        """
+        Ключ кэша: город из каталога или нормализованное имя
+        """
+
+        city = city_catalog.find(city_name)
+        return city.key if city else normalize_city_name(city_name)
+
+    def cached(self, city_name: str) -> Optional[Forecast]:
+        """
+        Прогноз из кэша без обращения к источникам
+        """
+
+        entry = self.cache.get(self.city_key(city_name))
+        return entry.value if entry else None
+
+    def _start(self, key: str, city_name: str, source2: Any = _FETCH) -> asyncio.Task:
+        """
+        Общая загрузка города: новая или уже идущая
+
+        source2 - уже загруженные данные Gismeteo, если они есть
+        """
+
+        level = upstream_priority.get()
+        task = self._inflight.get(key)
+        if task is not None:
+            # Присоединившийся запрос важнее начавшего загрузку - ускоряем ее
+            get_quota().boost(self._urgencies[key], level)
+            return task
+
+        self._partials[key] = asyncio.get_running_loop().create_future()
+        urgency = self._urgencies[key] = Urgency(level)
+        # Задача копирует контекст при создании и видит свой приоритет
+        token = upstream_urgency.set(urgency)
+        try:
+            task = asyncio.create_task(self._load(key, city_name, source2))
+        finally:
+            upstream_urgency.reset(token)
+        self._inflight[key] = task
+
+        def cleanup(_: asyncio.Task) -> None:
+            self._inflight.pop(key, None)
+            self._partials.pop(key, None)
+            self._urgencies.pop(key, None)
+
+        task.add_done_callback(cleanup)
+        return task
+
+    def refresh(self, city_name: str) -> asyncio.Task:
+        """
+        Фоновое обновление прогноза с низким приоритетом у источников
+        """
+
+        with priority(PRIORITY_PREFETCH):
+            return self._start(self.city_key(city_name), city_name)
+
+    async def refresh_many(self, city_names: list[str]) -> None:
+        """
+        Обновить прогнозы нескольких городов одной пакетной загрузкой Gismeteo
+        """
+
+        names: dict[str, str] = {}
+        for city_name in city_names:
+            key = self.city_key(city_name)
+            if key not in self._inflight:
+                names.setdefault(key, city_name)
+        if not names:
+            return
+
+        pages = await asyncio.to_thread(
+            get_gismeteo_crawler().crawl,
+            [self._query(name) for name in names.values()]
+        )
+        tasks = [
+            self._start(key, name, pages.get(self._query(name)))
+            for key, name in names.items()
+        ]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _lookup(self, key: str, city_name: str) -> Optional[CacheEntry]:
+        """
+        Свежая запись кэша или, в окне отсрочки, устаревшая с фоновым обновлением
+        """
+
+        self.popularity.record(key, city_name)
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+
+        entry = self.cache.peek(key)
+        if entry is not None and entry.value is not None and -entry.ttl_left() < FORECAST_GRACE:
+            self.refresh(city_name)
+            return entry
+        return None
+
+    async def get(self, city_name: str) -> Optional[Forecast]:
+        """
+        Прогноз для города: из кэша или одной общей загрузкой
+        """
+
+        key = self.city_key(city_name)
+        entry = self._lookup(key, city_name)
+        if entry is not None:
+            return entry.value
+
+        return await asyncio.shield(self._start(key, city_name))
+
+    async def get_within(self, city_name: str, timeout: float) -> Optional[Forecast]:
+        """
+        Прогноз с жестким ограничением ожидания
+
+        По таймауту бросает asyncio.TimeoutError, а загрузка продолжается
+        в фоне и прогревает кэш
+        """
+
+        return await asyncio.wait_for(self.get(city_name), timeout)
+
+    async def progressive(
+        self,
+        city_name: str,
+        timeout: float
+    ) -> AsyncIterator[tuple[Optional[Forecast], bool]]:
+        """
+        Прогноз по мере готовности: (прогноз, предварительный ли он)
+
+        Сначала - по первому ответившему источнику, затем - объединенный.
+        Если объединенный не успел за timeout, предварительный отдается
+        повторно как окончательный
+        """
+
+        key = self.city_key(city_name)
+        entry = self._lookup(key, city_name)
+        if entry is not None:
+            yield entry.value, False
+            return
+
+        task = self._start(key, city_name)
+        partial = self._partials.get(key)
+        if partial is not None:
+            await asyncio.wait(
+                {asyncio.shield(task), asyncio.shield(partial)},
+                return_when=asyncio.FIRST_COMPLETED
+            )
+
+        if task.done():
+            yield task.result(), False
+            return
+
+        preliminary = partial.result() if partial is not None and partial.done() else None
+        if preliminary is None:
+            yield await asyncio.shield(task), False
+            return
+
+        yield preliminary, True
+        try:
+            yield await asyncio.wait_for(asyncio.shield(task), timeout), False
+        except asyncio.TimeoutError:
+            yield preliminary, False
+
+    def _preliminary(
+        self,
+        key: str,
+        display_name: str,
+        results: dict[str, Optional[dict]]
+    ) -> Optional[Forecast]:
+        """
+        Отчет по единственному ответившему источнику, без записи в историю
+
+        Вызывается в рабочем потоке: тренды читаются из истории показаний
+        """
+
+        data1 = results.get("source1")
+        data2 = results.get("source2")
+        if not data1 and not data2:
+            return None
+
+        data1 = dict(data1 or {})
+        data1["city_name"] = display_name
+        merged_data = get_weather_analyzer().merge_all_data(
+            data1, data2 or {}, record=False, history_key=key
+        )
+        merged_data["data_sources"] = 1
+        return Forecast(
+            city_key=key,
+            merged_data=merged_data,
+            digest=report_digest(merged_data),
+            fetched_at=time.time()
+        )
+
+    @staticmethod
+    def _query(city_name: str) -> str:
+        city = city_catalog.find(city_name)
+        return city.name if city else city_name
+
+    async def _load(self, key: str, city_name: str, source2: Any = _FETCH) -> Optional[Forecast]:
+        # Задача загрузки работает в своей копии контекста, метка не утекает
+        city_var.set(key)
+
+        city = city_catalog.find(city_name)
+        query = self._query(city_name)
+        # Города каталога запрашиваем по координатам - без неоднозначности имен
+        coordinates = (city.latitude, city.longitude) if city else None
+
+        # Квота берется до перехода в поток: ожидающие не занимают пул потоков
+        sources: dict[asyncio.Task, str] = {
+            asyncio.create_task(to_thread(
+                {OPENWEATHERMAP: FORECAST_DATA_REQUESTS},
+                get_weather_service().get_forecast_data, query, coordinates
+            )): "source1",
+        }
+        results: dict[str, Optional[dict]] = {}
+        if source2 is _FETCH and not get_gismeteo_parser().has_page(query):
+            # Страница города на Gismeteo неизвестна - только OpenWeatherMap
+            source2 = None
+        if source2 is _FETCH:
+            sources[asyncio.create_task(to_thread(
+                {GISMETEO: 1},
+                get_gismeteo_parser().get_weather, query
+            ))] = "source2"
+        else:
+            results["source2"] = source2
+        partial = self._partials.get(key)
+
+        pending = set(sources)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                results[sources[task]] = task.result()
+
+            # Первый ответивший источник - предварительный отчет для ждущих.
+            # Тренды читаются из файла истории, поэтому тоже не в цикле событий
+            if pending and partial is not None and not partial.done():
+                try:
+                    partial.set_result(await asyncio.to_thread(
+                        self._preliminary, key, query, dict(results)
+                    ))
+                except Exception as e:
+                    logger.error(f"Ошибка предварительного отчета для {city_name}: {e}")
+                    partial.set_result(None)
+
+        if partial is not None and not partial.done():
+            partial.set_result(None)
+
+        data1 = results.get("source1")
+        data2 = results.get("source2")
+
+        if data1 is None:
+            self.cache.set(key, None, FORECAST_NEGATIVE_TTL)
+            return None
+        if city is not None:
+            data1["city_name"] = city.name
+
+        try:
+            # Запись истории и обучение весов - файловый ввод-вывод, не в цикле событий
+            merged_data = await asyncio.to_thread(
+                get_weather_analyzer().merge_all_data, data1, data2 or {}, True, key
+            )
+        except Exception as e:
+            logger.error(f"Ошибка объединения данных для {city_name}: {e}")
+            return None
+
+        forecast = Forecast(
+            city_key=key,
+            merged_data=merged_data,
+            digest=report_digest(merged_data),
+            fetched_at=time.time()
+        )
+        self.cache.set(key, forecast, FORECAST_TTL)
+
+        for listener in self.listeners:
+            try:
+                listener(forecast)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика прогноза для {city_name}: {e}")
+        return forecast
+
+    def render(
+        self,
+        forecast: Forecast,
+        locale: str = DEFAULT_LOCALE,
+        fmt: str = FORMAT_TEXT
+    ) -> str:
+        return get_weather_analyzer().print_weather_report(
+            forecast.merged_data,
+            locale=locale,
+            fmt=fmt,
+            digest=forecast.digest
+        )
+
+
+@lru_cache(maxsize=None)
+def get_forecast_service() -> ForecastService:
+    """
+    Глобальный сервис прогнозов с общим кэшем
+    """
+
+    return ForecastService(ForecastCache(), PopularityTracker(REFRESH_TOP_K))
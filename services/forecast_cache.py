@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import time
+from typing import Any, Callable, Iterator, Optional
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    value: Any
+    # Время по часам системы, чтобы записи переживали перезапуск
+    expires_at: float
+
+    def ttl_left(self, now: Optional[float] = None) -> float:
+        return self.expires_at - (time.time() if now is None else now)
+
+
+class ForecastCache:
+    def __init__(self, max_entries: int = 1024) -> None:
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.max_entries = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        # Источник записей, которых нет в памяти (снимок прошлого запуска)
+        self.restore: Optional[Callable[[str], Optional[CacheEntry]]] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def items(self) -> Iterator[tuple[str, CacheEntry]]:
+        return iter(list(self._entries.items()))
+
+    def _find(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None and self.restore is not None:
+            entry = self.restore(key)
+            if entry is not None:
+                self._store(key, entry)
+        return entry
+
+    def _store(self, key: str, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Запись кэша, если она еще не устарела
+        """
+
+        entry = self._find(key)
+        if entry is None or entry.ttl_left() <= 0:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def peek(self, key: str) -> Optional[CacheEntry]:
+        """
+        Запись кэша, даже устаревшая, без учета в статистике
+        """
+
+        return self._find(key)
+
+    def set(self, key: str, value: Any, ttl: float) -> CacheEntry:
+        entry = CacheEntry(value=value, expires_at=time.time() + ttl)
+        self._store(key, entry)
+        return entry
@@ -0,0 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import threading
+import time
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+from config import CRAWL_CONCURRENCY, CRAWL_HOST_DELAY, CRAWL_PER_HOST
+from services.parse_gismeteo import GismeteoParser, get_gismeteo_parser
+from services.quota import priority, upstream_priority
+
+
+class HostGate:
+    """
+    Вежливость к одному сайту: не больше limit запросов одновременно
+    и не чаще одного начала запроса в delay секунд
+    """
+
+    def __init__(self, limit: int, delay: float) -> None:
+        self.delay = delay
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def __enter__(self) -> "HostGate":
+        self._slots.acquire()
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.delay
+        time.sleep(start - now)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._slots.release()
+
+
+class GismeteoCrawler:
+    """
+    Загрузка страниц многих городов с ограничением параллельности
+
+    Каждая страница читается потоково и только до нужных блоков
+    """
+
+    def __init__(
+        self,
+        parser: GismeteoParser,
+        concurrency: int = 4,
+        per_host: int = 2,
+        host_delay: float = 1.0
+    ) -> None:
+        self.parser = parser
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.host_delay = host_delay
+        self._gates: dict[str, HostGate] = {}
+        self._lock = threading.Lock()
+
+    def _gate(self, url: str) -> HostGate:
+        host = urlparse(url).hostname or ""
+        with self._lock:
+            gate = self._gates.get(host)
+            if gate is None:
+                gate = self._gates[host] = HostGate(self.per_host, self.host_delay)
+        return gate
+
+    def _fetch(self, url: str, city: str, level: int) -> Optional[dict[str, Any]]:
+        # Потоки пула не наследуют контекст - приоритет передается явно
+        with priority(level):
+            with self._gate(url):
+                return self.parser.get_weather(city)
+
+    def crawl(
+        self,
+        cities: list[str],
+        level: Optional[int] = None
+    ) -> dict[str, Optional[dict[str, Any]]]:
+        """
+        Данные Gismeteo для списка городов; None - если город не загрузился
+        """
+
+        # Города без своей страницы не запрашиваются, одна страница - один раз
+        urls: dict[str, str] = {}
+        for city in cities:
+            url = self.parser.get_city_url(city)
+            if url is not None:
+                urls.setdefault(url, city)
+
+        result: dict[str, Optional[dict[str, Any]]] = dict.fromkeys(cities)
+        if not urls:
+            return result
+
+        level = upstream_priority.get() if level is None else level
+        workers = min(self.concurrency, len(urls))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crawl") as pool:
+            pages = dict(zip(
+                urls,
+                pool.map(lambda item: self._fetch(item[0], item[1], level), urls.items())
+            ))
+
+        for city in cities:
+            url = self.parser.get_city_url(city)
+            if url is not None:
+                result[city] = pages[url]
+        return result
+
+
+@lru_cache(maxsize=None)
+def get_gismeteo_crawler() -> GismeteoCrawler:
+    """
+    Глобальный загрузчик страниц Gismeteo
+    """
+
+    return GismeteoCrawler(
+        get_gismeteo_parser(),
+        CRAWL_CONCURRENCY,
+        CRAWL_PER_HOST,
+        CRAWL_HOST_DELAY
+    )
@@ -0,0 +1,162 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+import math
+import re
+from typing import Any, Callable, Iterator, Optional
+
+HOUR = 3600
+
+# Поля почасового прогноза
+FIELDS: tuple[str, ...] = ("temperature", "wind", "humidity")
+
+
+class HourlySeries:
+    """
+    Почасовой ряд в компактных массивах: время UTC и значения по полям
+    """
+
+    __slots__ = ("utc_offset", "timestamps", "values")
+
+    def __init__(self, utc_offset: int = 0) -> None:
+        # Смещение часового пояса города, секунды
+        self.utc_offset = utc_offset
+        self.timestamps = array("d")
+        self.values: dict[str, array] = {field: array("f") for field in FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, timestamp: float, **values: Optional[float]) -> None:
+        self.timestamps.append(timestamp)
+        for field in FIELDS:
+            value = values.get(field)
+            self.values[field].append(math.nan if value is None else value)
+
+    @classmethod
+    def from_owm(cls, payload: dict[str, Any]) -> "HourlySeries":
+        """
+        Ряд из ответа OpenWeatherMap /forecast (шаг 3 часа)
+        """
+
+        series = cls(utc_offset=payload.get("city", {}).get("timezone", 0))
+        for item in payload.get("list", []):
+            series.append(
+                float(item["dt"]),
+                temperature=item.get("main", {}).get("temp"),
+                wind=item.get("wind", {}).get("speed"),
+                humidity=item.get("main", {}).get("humidity")
+            )
+        return series
+
+    @classmethod
+    def from_labels(
+        cls,
+        labels: list[str],
+        values: dict[str, list[Optional[float]]],
+        utc_offset: int,
+        now: float
+    ) -> "HourlySeries":
+        """
+        Ряд из меток местного времени вида "15:00" (Gismeteo)
+        """
+
+        series = cls(utc_offset=utc_offset)
+        tz = timezone(timedelta(seconds=utc_offset))
+        midnight = datetime.fromtimestamp(now, tz).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ).timestamp()
+
+        previous: Optional[float] = None
+        for index, label in enumerate(labels):
+            match = re.search(r"(\d{1,2}):(\d{2})", label)
+            if not match:
+                continue
+            timestamp = midnight + int(match.group(1)) * HOUR + int(match.group(2)) * 60
+            # Метки идут по порядку, переход через полночь - следующий день
+            if timestamp < now - HOUR or (previous is not None and timestamp <= previous):
+                timestamp += 24 * HOUR
+            previous = timestamp
+            series.append(timestamp, **{
+                field: column[index] if index < len(column) else None
+                for field, column in values.items()
+            })
+        return series
+
+    def value_at(self, field: str, timestamp: float) -> float:
+        """
+        Линейная интерполяция значения на момент времени
+        """
+
+        timestamps = self.timestamps
+        column = self.values[field]
+        if not timestamps or timestamp < timestamps[0] or timestamp > timestamps[-1]:
+            return math.nan
+
+        low, high = 0, len(timestamps) - 1
+        while high - low > 1:
+            middle = (low + high) // 2
+            if timestamps[middle] <= timestamp:
+                low = middle
+            else:
+                high = middle
+
+        if timestamps[high] == timestamps[low]:
+            return column[low]
+        share = (timestamp - timestamps[low]) / (timestamps[high] - timestamps[low])
+        return column[low] + (column[high] - column[low]) * share
+
+    def window(self, start: float, hours: int) -> Iterator[dict[str, Any]]:
+        """
+        Точки ряда в окне [start, start + hours) для отрисовки
+        """
+
+        tz = timezone(timedelta(seconds=self.utc_offset))
+        end = start + hours * HOUR
+
+        for index, timestamp in enumerate(self.timestamps):
+            if timestamp < start:
+                continue
+            if timestamp >= end:
+                break
+            point: dict[str, Any] = {
+                "time": datetime.fromtimestamp(timestamp, tz).strftime("%H:%M")
+            }
+            for field in FIELDS:
+                value = self.values[field][index]
+                if not math.isnan(value):
+                    point[field] = round(value, 1)
+            yield point
+
+
+def align(
+    series: dict[str, HourlySeries],
+    weight: Callable[[str, str], float],
+    now: float,
+    hours: int,
+    step: int = HOUR
+) -> HourlySeries:
+    """
+    Объединение рядов источников на общей сетке времени с весами источников
+    """
+
+    utc_offset = next(iter(series.values())).utc_offset if series else 0
+    combined = HourlySeries(utc_offset=utc_offset)
+    start = math.ceil(now / step) * step
+
+    for timestamp in range(int(start), int(start + hours * HOUR), step):
+        values: dict[str, Optional[float]] = {}
+        for field in FIELDS:
+            total = 0.0
+            total_weight = 0.0
+            for source, source_series in series.items():
+                value = source_series.value_at(field, timestamp)
+                if not math.isnan(value):
+                    source_weight = weight(source, field)
+                    total += value * source_weight
+                    total_weight += source_weight
+            values[field] = total / total_weight if total_weight else None
+
+        if any(value is not None for value in values.values()):
+            combined.append(float(timestamp), **values)
+
+    return combined
@@ -0,0 +1,96 @@
+from html.parser import HTMLParser
+from typing import Optional
+
+# Элементы без закрывающего тега
+VOID_ELEMENTS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+})
+
+
+class RegionExtractor(HTMLParser):
+    """
+    Потоковое извлечение нужных фрагментов страницы
+
+    Страница подается кусками по мере загрузки; сохраняется только
+    разметка элементов с заданными (тег, класс). Когда все фрагменты
+    прочитаны, done становится True и загрузку можно прервать
+    """
+
+    def __init__(self, regions: tuple[tuple[str, str], ...]) -> None:
+        super().__init__(convert_charrefs=False)
+        self.pending: set[tuple[str, str]] = set(regions)
+        self.parts: list[str] = []
+        # Фрагмент, который читается сейчас, и глубина вложенности в нем
+        self._current: Optional[tuple[str, str]] = None
+        self._depth = 0
+
+    @property
+    def done(self) -> bool:
+        return not self.pending and self._current is None
+
+    def html(self) -> str:
+        return "".join(self.parts)
+
+    def _match(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> Optional[tuple[str, str]]:
+        classes = dict(attrs).get("class") or ""
+        for class_name in classes.split():
+            region = (tag, class_name)
+            if region in self.pending:
+                return region
+        return None
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        region = self._match(tag, attrs)
+        if self._current is None:
+            if region is None:
+                return
+            self._current = region
+            self._depth = 0
+        elif region is not None:
+            # Вложенный фрагмент уже попадает в текущий
+            self.pending.discard(region)
+
+        self.parts.append(self.get_starttag_text())
+        if tag not in VOID_ELEMENTS:
+            self._depth += 1
+        elif self._depth == 0:
+            self._close()
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        if self._current is None:
+            region = self._match(tag, attrs)
+            if region is None:
+                return
+            self._current = region
+            self._depth = 0
+
+        self.parts.append(self.get_starttag_text())
+        if self._depth == 0:
+            self._close()
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._current is None or tag in VOID_ELEMENTS:
+            return
+
+        self.parts.append(f"</{tag}>")
+        self._depth -= 1
+        if self._depth <= 0:
+            self._close()
+
+    def handle_data(self, data: str) -> None:
+        if self._current is not None:
+            self.parts.append(data)
+
+    def handle_entityref(self, name: str) -> None:
+        if self._current is not None:
+            self.parts.append(f"&{name};")
+
+    def handle_charref(self, name: str) -> None:
+        if self._current is not None:
+            self.parts.append(f"&#{name};")
+
+    def _close(self) -> None:
+        self.pending.discard(self._current)
+        self._current = None
+        self.parts.append("\n")
@@ -0,0 +1,149 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import copy
+from datetime import datetime, timezone
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Iterator, Optional
+
+from config import LOG_DEBUG_SAMPLE_RATE, LOG_LEVEL
+
+# Идентификаторы для связи записей одного запроса и одного города
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+city_var: ContextVar[Optional[str]] = ContextVar("city", default=None)
+
+# Стандартные поля LogRecord - все остальное пришло через extra
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "request_id", "city",
+}
+
+
+@contextmanager
+def log_context(
+    request_id: Optional[str] = None,
+    city: Optional[str] = None
+) -> Iterator[None]:
+    """
+    Пометить записи внутри блока идентификатором запроса и/или города
+    """
+
+    tokens = []
+    if request_id is not None:
+        tokens.append((request_id_var, request_id_var.set(request_id)))
+    if city is not None:
+        tokens.append((city_var, city_var.set(city)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class CorrelationFilter(logging.Filter):
+    """
+    Переносит идентификаторы из контекста в запись
+
+    Работает в потоке, который пишет в лог, пока контекст еще доступен
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.city = city_var.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    Пропускает только долю отладочных записей, остальные уровни - все
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        return random.random() < self.rate
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Кладет в очередь запись с готовым текстом, но без склейки с traceback
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in ("request_id", "city"):
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                payload[key] = value
+
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def setup_logging(
+    level: str = LOG_LEVEL,
+    debug_sample_rate: float = LOG_DEBUG_SAMPLE_RATE
+) -> logging.handlers.QueueListener:
+    """
+    Неблокирующее логирование: запись кладется в очередь, а в stdout ее
+    пишет фоновый поток. Слушатель нужно остановить при завершении
+    """
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSamplingFilter(debug_sample_rate))
+    queue_handler.addFilter(CorrelationFilter())
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
+
+def setup_worker_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Логирование в процессе пула разбора: там один поток, поэтому
+    записи в том же формате пишутся в stdout напрямую, без очереди
+    """
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [stream_handler]
+    root.setLevel(level)
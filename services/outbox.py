@@ -0,0 +1,348 @@
+import asyncio
+from dataclasses import dataclass
+from functools import lru_cache
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNotFound,
+    TelegramRetryAfter
+)
+
+from services.storage import connect
+from services.subscriptions import unsubscribe
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых в чат больше нельзя писать
+PERMANENT_CHAT_ERRORS = (TelegramForbiddenError, TelegramNotFound)
+# Ошибки, при которых это сообщение никогда не будет доставлено
+PERMANENT_MESSAGE_ERRORS = (TelegramBadRequest,)
+# Telegram сообщает о пропавшем чате и как о неверном запросе
+PERMANENT_CHAT_DESCRIPTIONS = ("chat not found", "user is deactivated")
+
+
+def is_chat_gone(error: Exception) -> bool:
+    """
+    Писать в чат больше нельзя - ни это, ни следующие сообщения
+    """
+
+    if isinstance(error, PERMANENT_CHAT_ERRORS):
+        return True
+    description = str(error).lower()
+    return isinstance(error, TelegramBadRequest) and any(
+        text in description for text in PERMANENT_CHAT_DESCRIPTIONS
+    )
+
+
+@dataclass(frozen=True)
+class OutboxMessage:
+    id: int
+    chat_id: int
+    text: str
+    attempts: int
+
+
+class Outbox:
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        max_attempts: int = 6,
+        base_delay: float = 2.0,
+        max_delay: float = 600.0
+    ) -> None:
+        self.connection = connection
+        # Очередь разбирается из рабочих потоков - подключение одно на всех
+        self._lock = threading.Lock()
+        self.max_attempts = max_attempts
+        # Параметры экспоненциальной задержки между попытками, секунды
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    dedup_key TEXT UNIQUE,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS outbox_due
+                    ON outbox (status, next_attempt_at);
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    error TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    failed_at REAL NOT NULL
+                );
+            """)
+
+    def enqueue_many(self, messages: list[tuple[int, str, Optional[str]]]) -> int:
+        """
+        Поставить сообщения (чат, текст, ключ дедупликации) в очередь
+
+        Сообщение с уже известным ключом повторно не ставится
+        """
+
+        now = time.time()
+        with self._lock, self.connection:
+            cursor = self.connection.executemany(
+                "INSERT OR IGNORE INTO outbox "
+                "(chat_id, text, dedup_key, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(chat_id, text, dedup_key, now, now) for chat_id, text, dedup_key in messages]
+            )
+        return cursor.rowcount
+
+    def enqueue(self, chat_id: int, text: str, dedup_key: Optional[str] = None) -> int:
+        return self.enqueue_many([(chat_id, text, dedup_key)])
+
+    def claim(self, limit: int) -> list[OutboxMessage]:
+        """
+        Забрать готовые к отправке сообщения, пометив их как отправляемые
+        """
+
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.connection.execute(
+                    "SELECT id, chat_id, text, attempts FROM outbox "
+                    "WHERE status = 'pending' AND next_attempt_at <= ? "
+                    "ORDER BY next_attempt_at LIMIT ?",
+                    (time.time(), limit)
+                ).fetchall()
+                self.connection.executemany(
+                    "UPDATE outbox SET status = 'sending' WHERE id = ?",
+                    [(row[0],) for row in rows]
+                )
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+        return [OutboxMessage(*row) for row in rows]
+
+    def mark_sent(self, message: OutboxMessage) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1 WHERE id = ?",
+                (message.id,)
+            )
+
+    def retry(self, message: OutboxMessage, error: str, delay: Optional[float] = None) -> None:
+        """
+        Повторить отправку позже с экспоненциальной задержкой
+        """
+
+        attempts = message.attempts + 1
+        if attempts >= self.max_attempts:
+            self.dead_letter(message, error)
+            return
+
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * 2 ** message.attempts)
+            delay *= random.uniform(0.8, 1.2)
+
+        with self._lock, self.connection:
+            self.connection.execute(
+                "UPDATE outbox SET status = 'pending', attempts = ?, "
+                "next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, error, message.id)
+            )
+
+    def postpone(self, message: OutboxMessage, error: str, delay: float) -> None:
+        """
+        Отложить отправку, не расходуя попытки: сообщение тут ни при чем
+        """
+
+        with self._lock, self.connection:
+            self.connection.execute(
+                "UPDATE outbox SET status = 'pending', next_attempt_at = ?, "
+                "last_error = ? WHERE id = ?",
+                (time.time() + delay, error, message.id)
+            )
+
+    def release(self, messages: list[OutboxMessage], delay: float = 0.0) -> None:
+        """
+        Вернуть забранные, но не отправленные сообщения в очередь
+        """
+
+        if not messages:
+            return
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "UPDATE outbox SET status = 'pending', next_attempt_at = ? "
+                "WHERE id = ? AND status = 'sending'",
+                [(time.time() + delay, message.id) for message in messages]
+            )
+
+    def dead_letter(self, message: OutboxMessage, error: str) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO dead_letters (chat_id, text, error, attempts, failed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (message.chat_id, message.text, error, message.attempts + 1, time.time())
+            )
+            self.connection.execute(
+                "UPDATE outbox SET status = 'dead', last_error = ? WHERE id = ?",
+                (error, message.id)
+            )
+
+    def recover_inflight(self) -> None:
+        """
+        Вернуть в очередь сообщения, отправка которых прервалась остановкой
+        """
+
+        with self._lock, self.connection:
+            self.connection.execute(
+                "UPDATE outbox SET status = 'pending' WHERE status = 'sending'"
+            )
+
+    def purge(self, older_than: float = 3 * 24 * 3600) -> None:
+        """
+        Удалить давно обработанные записи (ключи дедупликации больше не нужны)
+        """
+
+        with self._lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM outbox WHERE status IN ('sent', 'dead') AND created_at < ?",
+                (time.time() - older_than,)
+            )
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            stats = dict(self.connection.execute(
+                "SELECT status, COUNT(*) FROM outbox GROUP BY status"
+            ).fetchall())
+            stats["dead_letters"] = self.connection.execute(
+                "SELECT COUNT(*) FROM dead_letters"
+            ).fetchone()[0]
+        return stats
+
+
+def unsubscribe_chat(chat_id: int) -> None:
+    unsubscribe(chat_id)
+    logger.info(f"🗑️ Пользователь {chat_id} удален из подписок")
+
+
+class OutboxWorkers:
+    def __init__(
+        self,
+        outbox: Outbox,
+        workers: int = 4,
+        batch_size: int = 10,
+        poll_interval: float = 1.0
+    ) -> None:
+        self.outbox = outbox
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        # До какого момента Telegram просил не отправлять (по часам цикла событий)
+        self._resume_at: float = 0.0
+
+    def start(self, bot: Bot) -> None:
+        """Запуск пула воркеров, разбирающих очередь"""
+        self.outbox.recover_inflight()
+        self.outbox.purge()
+        self._tasks = [
+            asyncio.create_task(self._worker(bot), name=f"outbox-worker-{index}")
+            for index in range(self.workers)
+        ]
+        logger.info(f"Воркеры очереди отправки запущены: {self.workers}")
+
+    def notify(self) -> None:
+        """Разбудить воркеры после постановки сообщений в очередь"""
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Недоставленные сообщения вернутся в очередь при следующем запуске
+        await asyncio.to_thread(self.outbox.recover_inflight)
+
+    async def _worker(self, bot: Bot) -> None:
+        # Записи в общую базу ждут блокировку другого процесса - не в цикле событий
+        while True:
+            pause = self._resume_at - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+            messages = await asyncio.to_thread(self.outbox.claim, self.batch_size)
+            if not messages:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for index, message in enumerate(messages):
+                retry_after = await self._deliver(bot, message)
+                if retry_after is not None:
+                    # Остаток пачки упрется в то же ограничение - возвращаем его
+                    # в очередь, и все воркеры ждут, сколько просил Telegram
+                    await asyncio.to_thread(
+                        self.outbox.release, messages[index + 1:], retry_after
+                    )
+                    self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+                    break
+
+    async def _deliver(self, bot: Bot, message: OutboxMessage) -> Optional[float]:
+        """
+        Отправить сообщение; возвращает паузу, если Telegram ограничил частоту
+        """
+
+        try:
+            await bot.send_message(message.chat_id, message.text)
+            await asyncio.to_thread(self.outbox.mark_sent, message)
+        except TelegramRetryAfter as e:
+            # Ограничение частоты - не ошибка сообщения, Telegram сам говорит, сколько ждать
+            await asyncio.to_thread(self.outbox.postpone, message, str(e), e.retry_after)
+            return e.retry_after
+        except (*PERMANENT_CHAT_ERRORS, *PERMANENT_MESSAGE_ERRORS) as e:
+            if is_chat_gone(e):
+                logger.error(f"❌ Чат {message.chat_id} недоступен: {e}")
+                await asyncio.to_thread(self.outbox.dead_letter, message, str(e))
+                unsubscribe_chat(message.chat_id)
+            else:
+                logger.error(f"❌ Сообщение для {message.chat_id} отклонено: {e}")
+                await asyncio.to_thread(self.outbox.dead_letter, message, str(e))
+        except Exception as e:
+            logger.warning(f"Ошибка отправки пользователю {message.chat_id}, повторим: {e}")
+            await asyncio.to_thread(self.outbox.retry, message, str(e))
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_outbox() -> Outbox:
+    """
+    Глобальная очередь исходящих сообщений
+    """
+
+    # Отдельное подключение: очередь разбирается из рабочих потоков
+    return Outbox(connect(check_same_thread=False))
+
+
+@lru_cache(maxsize=None)
+def get_outbox_workers() -> OutboxWorkers:
+    """
+    Глобальный пул воркеров очереди
+    """
+
+    return OutboxWorkers(get_outbox())
@@ -1,39 +1,76 @@
+import codecs
+from functools import lru_cache
+import logging
 import re
-from typing import Any, LiteralString, Optional
+from typing import TYPE_CHECKING, Any, Optional
 
-from bs4 import BeautifulSoup
-import requests
+from config import UPSTREAM_TIMEOUT
+from services.city_catalog import city_catalog
+from services.html_regions import RegionExtractor
+from services.parse_pool import get_parse_pool
+from services.quota import get_quota
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+# Имя источника в лимитах UPSTREAM_LIMITS
+PROVIDER = "gismeteo"
+
+# Блоки страницы, из которых берутся данные: (тег, класс)
+PAGE_REGIONS = (
+    ("a", "city"),
+    ("div", "weather-info"),
+    ("div", "current-weather-forecast"),
+)
+# Размер куска при потоковом чтении страницы (байты)
+STREAM_CHUNK_SIZE = 16 * 1024
 
 
 class GismeteoParser:
     def __init__(self) -> None:
-        self.session = requests.Session()
-        # Говорим сайту, что данные получает браузер, а не программа
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        })
-        # Словарь с досутпными городами
-        self.cities: dict[str, str] = {
-            "иркутск": "irkutsk-4787",
-            "москва": "moscow-4368",
-            "санкт-петербург": "sankt-peterburg-4079",
-            "новосибирск": "novosibirsk-4690",
-            "екатеринбург": "yekaterinburg-4517"
-        }
-
-    def get_city_url(self, city_identifier) -> LiteralString:
+        # HTTP-сессия создается при первом запросе
+        self._session: Optional["requests.Session"] = None
+
+    @property
+    def session(self) -> "requests.Session":
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+            # Говорим сайту, что данные получает браузер, а не программа
+            self._session.headers.update({
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+            })
+        return self._session
+
+    @staticmethod
+    def has_page(city_identifier: str) -> bool:
         """
-        Получить URL для города по его идентификатору
+        Известна ли страница города на Gismeteo
         """
 
-        # В идеале вернуть f"https://www.gismeteo.ru/{city_identifier}"
-        return f"https://www.gismeteo.ru/"
+        city = city_catalog.find(city_identifier)
+        return city is not None and city.gismeteo_slug is not None
+
+    def get_city_url(self, city_identifier: str) -> Optional[str]:
+        """
+        URL текущей погоды города; None - если страница города неизвестна
+        """
+
+        city = city_catalog.find(city_identifier)
+        if city is None or city.gismeteo_slug is None:
+            return None
+        return f"https://www.gismeteo.ru/weather-{city.gismeteo_slug}/now/"
 
     def parse_weather_data(self, html_content):
         """
         Парсинг HTML и извлечение данных о погоде
         """
 
+        from bs4 import BeautifulSoup
+
         soup = BeautifulSoup(html_content, "html.parser")
         weather_data: dict[str, Any] = {}
 
@@ -51,7 +88,6 @@ class GismeteoParser:
         temp_elem = weather_block.find("temperature-value", {"value": True})
         if temp_elem:
             weather_data["temperature"] = float(temp_elem.get("value"))
-            print("="*10, type(weather_data["temperature"]))
             weather_data["temperature_unit"] = temp_elem.get("from-unit", "c")
 
         # 2. Описание погоды
@@ -144,46 +180,103 @@ class GismeteoParser:
         # 9. Прогноз по часам
         forecast_block = soup.find("div", class_="current-weather-forecast")
         if forecast_block:
-            time_slots = []
+            time_slots: list[str] = []
+            temperatures: list[Optional[float]] = []
             time_items = forecast_block.find_all("div", class_="row-item")
 
             for item in time_items:
                 time_span = item.find("span")
                 if time_span:
                     time_slots.append(time_span.get_text(strip=True))
+                    temp_val = item.find("temperature-value", {"value": True})
+                    temperatures.append(
+                        float(temp_val.get("value")) if temp_val else None
+                    )
 
             if time_slots:
-                weather_data["hourly_forecast"] = time_slots
+                weather_data["hourly_forecast"] = {
+                    "times": time_slots,
+                    "temperature": temperatures
+                }
 
         return weather_data
 
+    def read_regions(self, response: "requests.Response") -> str:
+        """
+        Читать страницу по мере загрузки, пока не встретятся нужные блоки
+        """
+
+        content_type = response.headers.get("Content-Type", "")
+        encoding = response.encoding if "charset" in content_type else "utf-8"
+        decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+
+        extractor = RegionExtractor(PAGE_REGIONS)
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            extractor.feed(decoder.decode(chunk))
+            # Остаток страницы не нужен - соединение закроется без дочитывания
+            if extractor.done:
+                break
+        else:
+            extractor.feed(decoder.decode(b"", final=True))
+
+        extractor.close()
+        return extractor.html()
+
     def get_weather(self, city_identifier) -> Optional[dict[str, Any]]:
         """
         Получить погоду для указанного города
         """
 
-        # Проверка, что город введен корректно
-        # if city_identifier not in self.cities:
-        #     return None
-
         url = self.get_city_url(city_identifier)
+        if url is None:
+            # Без своей страницы город не запрашиваем: иначе пришла бы чужая погода
+            logger.debug("Страница Gismeteo для %s неизвестна", city_identifier)
+            return None
+
+        import requests
 
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
+            get_quota().acquire(PROVIDER)
+            with self.session.get(url, timeout=UPSTREAM_TIMEOUT, stream=True) as response:
+                response.raise_for_status()
 
-            # Проверяем, что получили HTML
-            if "text/html" not in response.headers.get("Content-Type", ""):
-                print(f"Ошибка: ожидался HTML, но получен {response.headers.get("Content-Type")}")
-                return None
+                # Проверяем, что получили HTML
+                content_type = response.headers.get("Content-Type", "")
+                if "text/html" not in content_type:
+                    logger.warning(f"Ожидался HTML, но получен {content_type}")
+                    return None
 
-            return self.parse_weather_data(response.text)
+                html_content = self.read_regions(response)
+
+            # Разбор уходит в пул: туда - нужные фрагменты, обратно - поля
+            return get_parse_pool().run(parse_html, html_content)
         except requests.exceptions.RequestException as e:
-            print(f"Ошибка при запросе к {url}: {e}")
+            logger.error(f"Ошибка при запросе к {url}: {e}")
             return None
         except Exception as e:
-            print(f"Неожиданная ошибка: {e}")
+            logger.exception(f"Неожиданная ошибка разбора Gismeteo: {e}")
             return None
 
 
-gismeteo_parser = GismeteoParser()
+def parse_html(html_content: str) -> Optional[dict[str, Any]]:
+    """
+    Разбор страницы в воркере пула
+    """
+
+    return GismeteoParser().parse_weather_data(html_content)
+
+
+@lru_cache(maxsize=None)
+def get_gismeteo_parser() -> GismeteoParser:
+    """
+    Глобальный экземпляр парсера Gismeteo
+    """
+
+    return GismeteoParser()
+
+
+def __getattr__(name: str):
+    # Глобальный экземпляр создается лениво, при первом обращении
+    if name == "gismeteo_parser":
+        return get_gismeteo_parser()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
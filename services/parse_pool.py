@@ -0,0 +1,106 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+import logging
+import multiprocessing
+import threading
+from typing import Any, Callable, Optional
+
+from config import PARSE_MODE, PARSE_QUEUE_LIMIT, PARSE_QUEUE_TIMEOUT, PARSE_WORKERS
+from services.logging_setup import setup_worker_logging
+
+logger = logging.getLogger(__name__)
+
+MODE_INLINE = "inline"
+MODE_THREAD = "thread"
+MODE_PROCESS = "process"
+MODES = (MODE_INLINE, MODE_THREAD, MODE_PROCESS)
+
+
+class ParseQueueFull(Exception):
+    """
+    Очередь разбора переполнена дольше допустимого ожидания
+    """
+
+
+class ParsePool:
+    """
+    Пул для разбора HTML вне потоков запросов
+
+    В режиме process разбор идет в отдельных процессах и не конкурирует
+    за GIL с обработкой сообщений. Туда передается только текст страницы,
+    а обратно - компактный словарь полей. Число задач в пуле ограничено:
+    когда он занят, вызывающие ждут свободного места
+    """
+
+    def __init__(
+        self,
+        mode: str = MODE_PROCESS,
+        workers: int = 2,
+        queue_limit: int = 8,
+        queue_timeout: float = 10.0
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим разбора: {mode!r}")
+
+        self.mode = mode
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.rejected: int = 0
+
+    def _get_executor(self) -> Executor:
+        # Пул создается при первом разборе, а не при запуске бота
+        with self._lock:
+            if self._executor is None:
+                if self.mode == MODE_PROCESS:
+                    # К этому моменту в процессе уже есть потоки (лог, пулы):
+                    # fork мог бы унести в дочерний процесс захваченные блокировки
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=setup_worker_logging,
+                        initargs=(logging.getLevelName(logging.getLogger().level),)
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix="parse"
+                    )
+            return self._executor
+
+    def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Выполнить разбор в пуле и дождаться результата
+
+        Вызывается из рабочего потока; func должна быть функцией уровня
+        модуля, чтобы ее можно было передать в другой процесс
+        """
+
+        if self.mode == MODE_INLINE:
+            return func(*args)
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise ParseQueueFull(f"Очередь разбора занята дольше {self.queue_timeout} с")
+
+        try:
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+@lru_cache(maxsize=None)
+def get_parse_pool() -> ParsePool:
+    """
+    Глобальный пул разбора страниц
+    """
+
+    return ParsePool(PARSE_MODE, PARSE_WORKERS, PARSE_QUEUE_LIMIT, PARSE_QUEUE_TIMEOUT)
@@ -0,0 +1,126 @@
+from array import array
+import hashlib
+import json
+import struct
+from typing import Optional
+
+# Заголовок сохраненного скетча: ширина и глубина
+SKETCH_HEADER = struct.Struct("<II")
+
+
+class CountMinSketch:
+    """
+    Приближенные счетчики запросов в фиксированном объеме памяти
+
+    Оценка никогда не бывает меньше истинного значения, а ошибка вверх
+    ограничена шириной таблицы
+    """
+
+    def __init__(self, width: int = 1024, depth: int = 4) -> None:
+        self.width = width
+        self.depth = depth
+        self.rows: list[array] = [array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def _indexes(self, key: str) -> list[int]:
+        # Два хеша дают depth независимых позиций (схема Кирша-Митценмахера)
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """
+        Увеличить счетчик ключа; возвращает новую оценку
+        """
+
+        estimate = None
+        for row, index in zip(self.rows, self._indexes(key)):
+            value = min(row[index] + count, 0xFFFFFFFF)
+            row[index] = value
+            estimate = value if estimate is None else min(estimate, value)
+        return estimate or 0
+
+    def estimate(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+    def to_bytes(self) -> bytes:
+        return SKETCH_HEADER.pack(self.width, self.depth) + b"".join(
+            row.tobytes() for row in self.rows
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CountMinSketch":
+        width, depth = SKETCH_HEADER.unpack_from(data, 0)
+        sketch = cls(width, depth)
+        offset = SKETCH_HEADER.size
+        for row in sketch.rows:
+            row[:] = array("I", data[offset:offset + 4 * width])
+            offset += 4 * width
+        return sketch
+
+    def decay(self) -> None:
+        """
+        Уменьшить все счетчики вдвое, чтобы старые запросы забывались
+        """
+
+        for row in self.rows:
+            for index in range(self.width):
+                row[index] >>= 1
+
+
+class PopularityTracker:
+    """
+    Самые запрашиваемые города: скетч частот и короткий список лидеров
+    """
+
+    def __init__(self, top_size: int = 20, sketch: Optional[CountMinSketch] = None) -> None:
+        self.top_size = top_size
+        self.sketch = sketch or CountMinSketch()
+        # Кандидаты в лидеры: ключ -> (оценка, имя для запроса к источникам)
+        self._top: dict[str, tuple[int, str]] = {}
+
+    def record(self, key: str, name: str) -> int:
+        estimate = self.sketch.add(key)
+        self._top[key] = (estimate, name)
+
+        # Держим кандидатов с запасом, чтобы не пересортировывать на каждый запрос
+        if len(self._top) > 2 * self.top_size:
+            leaders = sorted(self._top.items(), key=lambda item: item[1][0], reverse=True)
+            self._top = dict(leaders[:self.top_size])
+        return estimate
+
+    def top(self, limit: Optional[int] = None) -> list[tuple[str, str, int]]:
+        """
+        Лидеры по убыванию популярности: (ключ, имя, оценка)
+        """
+
+        leaders = sorted(self._top.items(), key=lambda item: item[1][0], reverse=True)
+        return [
+            (key, name, estimate)
+            for key, (estimate, name) in leaders[:limit or self.top_size]
+        ]
+
+    def dump_top(self) -> bytes:
+        return json.dumps(
+            [[key, estimate, name] for key, (estimate, name) in self._top.items()],
+            ensure_ascii=False
+        ).encode("utf-8")
+
+    def restore(self, sketch: bytes, top: bytes) -> None:
+        """
+        Восстановить счетчики из снимка прошлого запуска
+        """
+
+        self.sketch = CountMinSketch.from_bytes(sketch)
+        self._top = {
+            key: (estimate, name)
+            for key, estimate, name in json.loads(bytes(top).decode("utf-8"))
+        }
+
+    def decay(self) -> None:
+        self.sketch.decay()
+        self._top = {
+            key: (estimate >> 1, name)
+            for key, (estimate, name) in self._top.items()
+            if estimate >> 1
+        }
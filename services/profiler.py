@@ -0,0 +1,133 @@
+import asyncio
+import cProfile
+from dataclasses import dataclass
+from functools import lru_cache
+import html
+import logging
+import os
+import pstats
+import time
+
+from aiogram import Bot
+
+from config import DATA_DIR, PROFILE_TOP, get_config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+MAX_SUMMARY_LENGTH = 3500
+
+
+class ProfilerBusy(Exception):
+    """
+    Профилирование уже идет
+    """
+
+
+@dataclass(frozen=True)
+class ProfileReport:
+    path: str
+    seconds: float
+    summary: str
+
+
+def summarize(stats: pstats.Stats, seconds: float, top: int = PROFILE_TOP) -> str:
+    """
+    Самые дорогие функции по собственному времени
+    """
+
+    rows = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:top]
+    lines = [
+        f"⏱ Профиль за {seconds:.0f} с, вызовов: {stats.total_calls}",
+        f"{'своё, мс':>8} {'всего, мс':>8} {'вызовы':>7}  функция",
+    ]
+    for (filename, line, name), (_, calls, own, cumulative, _) in rows:
+        where = f"{os.path.basename(filename)}:{line}" if line else filename
+        lines.append(
+            f"{own * 1000:8.1f} {cumulative * 1000:8.1f} {calls:7d}  {name} ({where})"
+        )
+    return "\n".join(lines)
+
+
+class Profiler:
+    """
+    Профилирование потока цикла событий по запросу администратора
+
+    В этом потоке выполняются обработчики и задачи планировщика.
+    Профилировщик включается только на заданное время, поэтому вне
+    сеанса накладных расходов нет
+    """
+
+    def __init__(self, directory: str, top: int = PROFILE_TOP) -> None:
+        self.directory = directory
+        self.top = top
+        self._active = False
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    async def run(self, seconds: float) -> ProfileReport:
+        """
+        Профилировать seconds секунд и сохранить результат на диск
+        """
+
+        if self._active:
+            raise ProfilerBusy()
+
+        self._active = True
+        profile = cProfile.Profile()
+        started = time.monotonic()
+        try:
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+        finally:
+            self._active = False
+        elapsed = time.monotonic() - started
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(
+            self.directory,
+            f"profile-{time.strftime('%Y%m%d-%H%M%S')}.prof"
+        )
+        stats = pstats.Stats(profile)
+        stats.dump_stats(path)
+        logger.info(f"Профиль сохранен: {path}")
+
+        return ProfileReport(path=path, seconds=elapsed, summary=summarize(stats, elapsed, self.top))
+
+
+@lru_cache(maxsize=None)
+def get_profiler() -> Profiler:
+    """
+    Глобальный профилировщик процесса
+    """
+
+    return Profiler(PROFILE_DIR)
+
+
+async def report_to_admin(bot: Bot, seconds: float) -> None:
+    """
+    Профилировать процесс и отправить сводку в чат администратора
+    """
+
+    try:
+        report = await get_profiler().run(seconds)
+    except ProfilerBusy:
+        logger.warning("Профилирование уже идет")
+        return
+
+    await bot.send_message(
+        get_config().chat_id.get_secret_value(),
+        render_report(report),
+        parse_mode="HTML"
+    )
+
+
+def render_report(report: ProfileReport) -> str:
+    # Сводка обрезается под ограничение длины сообщения Telegram
+    summary = html.escape(report.summary[:MAX_SUMMARY_LENGTH], quote=False)
+    return f"<pre>{summary}</pre>\nФайл профиля: {html.escape(report.path, quote=False)}"
@@ -0,0 +1,367 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+import heapq
+import itertools
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+
+from config import UPSTREAM_INTERACTIVE_RESERVE, UPSTREAM_LIMITS
+from services.storage import connect
+
+# Классы приоритета: меньше - важнее
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_BROADCAST = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_PREFETCH: "prefetch",
+    PRIORITY_BROADCAST: "broadcast",
+}
+
+# Приоритет текущей работы
+upstream_priority: ContextVar[int] = ContextVar(
+    "upstream_priority",
+    default=PRIORITY_INTERACTIVE
+)
+
+
+class Urgency:
+    """
+    Изменяемый приоритет общей загрузки: к ней может присоединиться
+    более важный запрос, и ее ожидание квоты должно ускориться
+    """
+
+    __slots__ = ("level",)
+
+    def __init__(self, level: int) -> None:
+        self.level = level
+
+
+# Общая загрузка, в которой идет текущая работа
+upstream_urgency: ContextVar[Optional[Urgency]] = ContextVar("upstream_urgency", default=None)
+# Разрешения, взятые заранее для работы в потоке: источник -> сколько осталось
+prepaid: ContextVar[Optional[dict[str, int]]] = ContextVar("prepaid", default=None)
+
+
+class QuotaExhausted(Exception):
+    """
+    Токенов источника нет, а ждать их в этом потоке нельзя
+    """
+
+    def __init__(self, provider: str, wait: float) -> None:
+        super().__init__(f"Лимит запросов к {provider} исчерпан, ждать {wait:.1f} с")
+        self.provider = provider
+        self.wait = wait
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """
+    Выполнить блок с заданным приоритетом обращений к источникам
+    """
+
+    token = upstream_priority.set(level)
+    try:
+        yield
+    finally:
+        upstream_priority.reset(token)
+
+
+class SharedBuckets:
+    """
+    Корзины токенов в общей базе: бюджет источника один на все процессы
+
+    Процессы бота и планировщика расходуют один лимит, а не каждый свой
+    """
+
+    def __init__(self, connection: sqlite3.Connection, limits: dict[str, tuple[float, int]]) -> None:
+        self.connection = connection
+        # источник -> (токенов в секунду, размер корзины)
+        self.limits: dict[str, tuple[float, int]] = {
+            name: (per_minute / 60, burst)
+            for name, (per_minute, burst) in limits.items()
+        }
+        self._lock = threading.Lock()
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS upstream_buckets (
+                    provider TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    stamp REAL NOT NULL
+                )
+            """)
+
+    def take(self, provider: str, count: int = 1, reserve: int = 0) -> float:
+        """
+        Взять count токенов, не трогая последние reserve
+
+        Возвращает 0, если токены взяты, иначе - сколько секунд ждать
+        """
+
+        rate, burst = self.limits[provider]
+        need = count + reserve
+        with self._lock, self.connection:
+            # Чтение и запись корзины - одна транзакция на все процессы
+            self.connection.execute("BEGIN IMMEDIATE")
+            row = self.connection.execute(
+                "SELECT tokens, stamp FROM upstream_buckets WHERE provider = ?",
+                (provider,)
+            ).fetchone()
+            now = time.time()
+            tokens = float(burst) if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            taken = tokens >= need
+            if taken:
+                tokens -= count
+            self.connection.execute(
+                "INSERT INTO upstream_buckets (provider, tokens, stamp) VALUES (?, ?, ?) "
+                "ON CONFLICT (provider) DO UPDATE SET tokens = excluded.tokens, stamp = excluded.stamp",
+                (provider, tokens, now)
+            )
+        return 0.0 if taken else (need - tokens) / rate
+
+
+class _Ticket:
+    __slots__ = ("level", "sequence", "count", "future", "urgency")
+
+    def __init__(
+        self,
+        level: int,
+        sequence: int,
+        count: int,
+        future: asyncio.Future,
+        urgency: Optional[Urgency]
+    ) -> None:
+        self.level = level
+        self.sequence = sequence
+        self.count = count
+        self.future = future
+        self.urgency = urgency
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.level, self.sequence) < (other.level, other.sequence)
+
+
+class _Provider:
+    __slots__ = ("waiting", "timer", "granted", "waited")
+
+    def __init__(self) -> None:
+        # Очередь ожидающих по приоритету
+        self.waiting: list[_Ticket] = []
+        # Отложенная проверка, когда у головы очереди появятся токены
+        self.timer: Optional[asyncio.TimerHandle] = None
+        # Выдано разрешений и суммарное ожидание по классам приоритета
+        self.granted: dict[int, int] = {}
+        self.waited: dict[int, float] = {}
+
+
+class QuotaScheduler:
+    """
+    Общие лимиты частоты запросов к внешним источникам
+
+    Разрешение берется в цикле событий до перехода в поток запроса,
+    поэтому ожидающие квоту не занимают потоки пула. Разрешения
+    выдаются по очереди приоритетов; фоновые загрузки не берут
+    последние токены - они остаются интерактивным запросам любого процесса
+    """
+
+    def __init__(
+        self,
+        buckets: SharedBuckets,
+        interactive_reserve: int = UPSTREAM_INTERACTIVE_RESERVE
+    ) -> None:
+        self.buckets = buckets
+        self.interactive_reserve = interactive_reserve
+        self._providers: dict[str, _Provider] = {
+            name: _Provider() for name in buckets.limits
+        }
+        self._sequence = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _reserve(self, provider: str, ticket: _Ticket) -> int:
+        if ticket.level == PRIORITY_INTERACTIVE:
+            return 0
+        _, burst = self.buckets.limits[provider]
+        return max(0, min(self.interactive_reserve, burst - ticket.count))
+
+    async def acquire_async(
+        self,
+        provider: str,
+        count: int = 1,
+        level: Optional[int] = None,
+        urgency: Optional[Urgency] = None
+    ) -> float:
+        """
+        Дождаться count разрешений на запросы; возвращает время ожидания
+        """
+
+        state = self._providers.get(provider)
+        if state is None:
+            return 0.0
+
+        urgency = upstream_urgency.get() if urgency is None else urgency
+        if level is None:
+            level = urgency.level if urgency is not None else upstream_priority.get()
+
+        self._loop = asyncio.get_running_loop()
+        _, burst = self.buckets.limits[provider]
+        ticket = _Ticket(
+            level,
+            next(self._sequence),
+            min(count, burst),
+            self._loop.create_future(),
+            urgency
+        )
+        started = time.monotonic()
+        heapq.heappush(state.waiting, ticket)
+        self._dispatch(provider)
+
+        # Отмененный билет остается в очереди, и _dispatch его пропустит
+        await ticket.future
+
+        waited = time.monotonic() - started
+        state.granted[ticket.level] = state.granted.get(ticket.level, 0) + 1
+        state.waited[ticket.level] = state.waited.get(ticket.level, 0.0) + waited
+        return waited
+
+    def _dispatch(self, provider: str) -> None:
+        state = self._providers[provider]
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+
+        while state.waiting:
+            ticket = state.waiting[0]
+            if ticket.future.done():
+                heapq.heappop(state.waiting)
+                continue
+
+            wait = self.buckets.take(provider, ticket.count, self._reserve(provider, ticket))
+            if wait > 0:
+                # Голова очереди ждет токенов; более важный билет перепроверит раньше
+                state.timer = self._loop.call_later(wait, self._dispatch, provider)
+                return
+
+            heapq.heappop(state.waiting)
+            ticket.future.set_result(None)
+
+    def boost(self, urgency: Urgency, level: int) -> None:
+        """
+        Поднять приоритет общей загрузки, к которой присоединился более важный запрос
+        """
+
+        if level >= urgency.level:
+            return
+
+        urgency.level = level
+        for provider, state in self._providers.items():
+            raised = False
+            for ticket in state.waiting:
+                if ticket.urgency is urgency and ticket.level > level:
+                    ticket.level = level
+                    raised = True
+            if raised:
+                heapq.heapify(state.waiting)
+                self._dispatch(provider)
+
+    def acquire(self, provider: str, level: Optional[int] = None) -> float:
+        """
+        Разрешение на запрос из рабочего потока
+
+        Если разрешение взято заранее (см. to_thread) - сразу. Иначе поток
+        ставится в общую очередь цикла событий и ждет. В потоке самого
+        цикла ждать нельзя: без свободного токена - QuotaExhausted
+        """
+
+        if provider not in self._providers:
+            return 0.0
+
+        paid = prepaid.get()
+        if paid and paid.get(provider, 0) > 0:
+            paid[provider] -= 1
+            return 0.0
+
+        level = upstream_priority.get() if level is None else level
+        loop = self._loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is not None:
+            # Цикл событий блокировать нельзя - берем токен без ожидания
+            wait = self.buckets.take(provider)
+            if wait > 0:
+                raise QuotaExhausted(provider, wait)
+            return 0.0
+        if loop is not None and loop.is_running():
+            return asyncio.run_coroutine_threadsafe(
+                self.acquire_async(provider, level=level, urgency=upstream_urgency.get()),
+                loop
+            ).result()
+
+        # Цикла событий нет (например, разовый скрипт) - просто ждем токен
+        started = time.monotonic()
+        while (wait := self.buckets.take(provider)) > 0:
+            time.sleep(wait)
+        return time.monotonic() - started
+
+    def stats(self) -> dict[str, dict]:
+        """
+        Глубина очередей и среднее ожидание по источникам и приоритетам
+        """
+
+        result: dict[str, dict] = {}
+        for name, state in self._providers.items():
+            depth = {label: 0 for label in PRIORITY_NAMES.values()}
+            for ticket in state.waiting:
+                if ticket.future.done():
+                    continue
+                label = PRIORITY_NAMES.get(ticket.level, str(ticket.level))
+                depth[label] = depth.get(label, 0) + 1
+
+            result[name] = {
+                "queue_depth": depth,
+                "granted": {
+                    PRIORITY_NAMES.get(level, str(level)): count
+                    for level, count in state.granted.items()
+                },
+                "avg_wait": {
+                    PRIORITY_NAMES.get(level, str(level)):
+                        round(state.waited[level] / count, 3)
+                    for level, count in state.granted.items()
+                },
+            }
+        return result
+
+
+@lru_cache(maxsize=None)
+def get_quota() -> QuotaScheduler:
+    """
+    Глобальный планировщик квот внешних источников
+    """
+
+    # Отдельное подключение: корзины берутся и из рабочих потоков
+    return QuotaScheduler(SharedBuckets(connect(check_same_thread=False), UPSTREAM_LIMITS))
+
+
+async def to_thread(permits: dict[str, int], func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Взять разрешения по приоритету в цикле событий, затем выполнить func в потоке
+
+    permits - сколько запросов к каким источникам сделает func
+    """
+
+    quota = get_quota()
+    for provider, count in permits.items():
+        await quota.acquire_async(provider, count)
+
+    token = prepaid.set(dict(permits))
+    try:
+        return await asyncio.to_thread(func, *args)
+    finally:
+        prepaid.reset(token)
@@ -0,0 +1,245 @@
+from array import array
+from functools import lru_cache
+import math
+import mmap
+import os
+import re
+import struct
+import time
+from typing import Any, Iterator, NamedTuple, Optional
+
+from config import DATA_DIR, READINGS_RETENTION
+from services.process_lock import ProcessLock
+
+# Запись фиксированного размера: время, источник, температура (°C),
+# влажность (%), давление (гПа), ветер (м/с). Отсутствующие значения - NaN
+RECORD = struct.Struct("<dBffff")
+
+FIELDS: tuple[str, ...] = ("temperature", "humidity", "pressure", "wind")
+
+# Коды источников в файле
+SOURCES: dict[str, int] = {
+    "source1": 0,   # OpenWeatherMap
+    "source2": 1,   # Gismeteo
+    "combined": 2,  # Объединенные данные
+}
+SOURCE_NAMES: dict[int, str] = {code: name for name, code in SOURCES.items()}
+
+
+class Reading(NamedTuple):
+    timestamp: float
+    source: str
+    temperature: float
+    humidity: float
+    pressure: float
+    wind: float
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class ReadingsStore:
+    """
+    История показаний по городам: файл записей фиксированного размера
+
+    Файлы общие для процессов бота и планировщика, поэтому дозапись
+    и переписывание при ретенции идут под межпроцессной блокировкой
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        retention: float = READINGS_RETENTION
+    ) -> None:
+        self.directory = directory
+        self.retention = retention
+        # Когда файлу города в следующий раз понадобится ретенция
+        self._retention_due: dict[str, float] = {}
+
+    def _path(self, city: str) -> str:
+        slug = re.sub(r"[^\w-]+", "_", city.strip().lower())
+        return os.path.join(self.directory, f"{slug}.bin")
+
+    @staticmethod
+    def _lock(path: str) -> ProcessLock:
+        return ProcessLock(f"{path}.lock")
+
+    def append(
+        self,
+        city: str,
+        source: str,
+        reading: dict[str, Any],
+        timestamp: Optional[float] = None
+    ) -> None:
+        """
+        Дописать показание в конец файла города
+        """
+
+        self.append_many(city, [(source, reading)], timestamp)
+
+    def append_many(
+        self,
+        city: str,
+        readings: list[tuple[str, dict[str, Any]]],
+        timestamp: Optional[float] = None
+    ) -> None:
+        """
+        Дописать показания нескольких источников одной записью в файл
+        """
+
+        timestamp = time.time() if timestamp is None else timestamp
+        records = b"".join(
+            RECORD.pack(
+                timestamp,
+                SOURCES[source],
+                *(_to_float(reading.get(field)) for field in FIELDS)
+            )
+            for source, reading in readings
+        )
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(city)
+        with self._lock(path):
+            with open(path, "ab") as file:
+                file.write(records)
+
+        # Начало файла читается один раз, дальше срок ретенции известен.
+        # Ретенция применяется с запасом, чтобы не переписывать файл часто
+        due = self._retention_due.get(path)
+        if due is None:
+            first = self._first_timestamp(path)
+            due = self._retention_due[path] = (first or timestamp) + self.retention * 1.1
+        if due < time.time():
+            self.apply_retention(city)
+
+    def _first_timestamp(self, path: str) -> Optional[float]:
+        with open(path, "rb") as file:
+            head = file.read(RECORD.size)
+        if len(head) < RECORD.size:
+            return None
+        return RECORD.unpack(head)[0]
+
+    @staticmethod
+    def _lower_bound(view: mmap.mmap, count: int, timestamp: float) -> int:
+        """
+        Бинарный поиск первой записи не раньше timestamp
+        """
+
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from("<d", view, middle * RECORD.size)[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def scan(
+        self,
+        city: str,
+        start: float,
+        end: float,
+        source: Optional[str] = None
+    ) -> Iterator[Reading]:
+        """
+        Показания города в интервале [start, end)
+        """
+
+        path = self._path(city)
+        if not os.path.exists(path) or os.path.getsize(path) < RECORD.size:
+            return
+
+        source_code = SOURCES[source] if source is not None else None
+
+        with open(path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                count = len(view) // RECORD.size
+                index = self._lower_bound(view, count, start)
+
+                while index < count:
+                    timestamp, code, *values = RECORD.unpack_from(
+                        view,
+                        index * RECORD.size
+                    )
+                    if timestamp >= end:
+                        break
+                    index += 1
+                    if source_code is not None and code != source_code:
+                        continue
+                    yield Reading(timestamp, SOURCE_NAMES[code], *values)
+
+    def column(
+        self,
+        city: str,
+        field: str,
+        start: float,
+        end: float,
+        source: str = "combined"
+    ) -> tuple[array, array]:
+        """
+        Временной ряд одного поля: (времена, значения) без пропусков
+        """
+
+        timestamps = array("d")
+        values = array("d")
+        position = FIELDS.index(field) + 2
+
+        for reading in self.scan(city, start, end, source):
+            value = reading[position]
+            if not math.isnan(value):
+                timestamps.append(reading.timestamp)
+                values.append(value)
+
+        return timestamps, values
+
+    def apply_retention(self, city: str) -> None:
+        """
+        Удалить показания старше срока хранения
+        """
+
+        path = self._path(city)
+        if not os.path.exists(path):
+            return
+
+        cutoff = time.time() - self.retention
+        # Чтение и замена файла под блокировкой: дозапись другого
+        # процесса не может попасть между ними и потеряться
+        with self._lock(path):
+            with open(path, "rb") as file:
+                data = file.read()
+
+            count = len(data) // RECORD.size
+            keep_from = count
+            for index in range(count):
+                if struct.unpack_from("<d", data, index * RECORD.size)[0] >= cutoff:
+                    keep_from = index
+                    break
+
+            kept = data[keep_from * RECORD.size:count * RECORD.size]
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(kept)
+            os.replace(tmp_path, path)
+
+        first = struct.unpack_from("<d", kept)[0] if kept else time.time()
+        self._retention_due[path] = first + self.retention * 1.1
+
+
+@lru_cache(maxsize=None)
+def get_readings_store() -> ReadingsStore:
+    """
+    Глобальное хранилище показаний
+    """
+
+    return ReadingsStore(os.path.join(DATA_DIR, "readings"))
+
+
+def __getattr__(name: str):
+    # Глобальный экземпляр создается лениво, при первом обращении
+    if name == "readings_store":
+        return get_readings_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
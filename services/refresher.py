@@ -0,0 +1,118 @@
+import asyncio
+from functools import lru_cache
+import logging
+import time
+from typing import Callable, Optional
+
+from config import POPULARITY_DECAY_INTERVAL, REFRESH_AHEAD, REFRESH_INTERVAL, REFRESH_TOP_K
+from services.alerts import get_alert_engine
+from services.forecast import ForecastService, get_forecast_service
+from services.quota import PRIORITY_PREFETCH, priority
+
+logger = logging.getLogger(__name__)
+
+
+class ForecastRefresher:
+    """
+    Фоновое обновление прогнозов для самых популярных городов
+
+    Прогноз лидера обновляется незадолго до истечения TTL, поэтому
+    запросы к популярным городам всегда попадают в кэш
+    """
+
+    def __init__(
+        self,
+        forecast_service: ForecastService,
+        top_k: int = REFRESH_TOP_K,
+        interval: float = REFRESH_INTERVAL,
+        ahead: float = REFRESH_AHEAD,
+        decay_interval: float = POPULARITY_DECAY_INTERVAL,
+        watched: Optional[Callable[[], list[str]]] = None
+    ) -> None:
+        self.forecast_service = forecast_service
+        # Города, которые обновляются независимо от популярности
+        self.watched = watched
+        self.top_k = top_k
+        self.interval = interval
+        self.ahead = ahead
+        self.decay_interval = decay_interval
+        self.refreshed: int = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def due(self) -> list[str]:
+        """
+        Популярные города, прогноз которых отсутствует или скоро истечет
+        """
+
+        candidates = [
+            (key, name)
+            for key, name, _ in self.forecast_service.popularity.top(self.top_k)
+        ]
+        if self.watched is not None:
+            candidates.extend(
+                (self.forecast_service.city_key(name), name)
+                for name in self.watched()
+            )
+
+        cities: list[str] = []
+        seen: set[str] = set()
+        for key, name in candidates:
+            if key in seen:
+                continue
+            seen.add(key)
+
+            entry = self.forecast_service.cache.peek(key)
+            # Ненайденные города не обновляем
+            if entry is not None and entry.value is None:
+                continue
+            if entry is None or entry.ttl_left() < self.ahead:
+                cities.append(name)
+        return cities
+
+    async def refresh_due(self) -> None:
+        cities = self.due()
+        if not cities:
+            return
+
+        with priority(PRIORITY_PREFETCH):
+            await self.forecast_service.refresh_many(cities)
+        self.refreshed += len(cities)
+        logger.info(f"🔄 Обновлено популярных городов: {len(cities)}")
+
+    async def _run(self) -> None:
+        last_decay = time.monotonic()
+        while True:
+            try:
+                await self.refresh_due()
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления прогнозов: {e}")
+
+            if time.monotonic() - last_decay >= self.decay_interval:
+                self.forecast_service.popularity.decay()
+                last_decay = time.monotonic()
+
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+@lru_cache(maxsize=None)
+def get_forecast_refresher() -> ForecastRefresher:
+    """
+    Глобальный обновитель популярных прогнозов
+    """
+
+    return ForecastRefresher(get_forecast_service(), watched=get_alert_engine().cities)
@@ -0,0 +1,588 @@
+import hashlib
+import html
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from string import Formatter
+from typing import Any, Callable, Optional
+
+# Поддерживаемые форматы вывода
+FORMAT_TEXT = "text"
+FORMAT_HTML = "html"
+
+DEFAULT_LOCALE = "ru"
+
+# Виды отчетов: текущая погода и прогноз по дням
+REPORT_CURRENT = "current"
+REPORT_DAILY = "daily"
+
+
+@dataclass(frozen=True)
+class SectionTemplate:
+    """
+    Шаблон одного раздела отчета
+    """
+
+    header: str
+    lines: tuple[str, ...] = ()
+    # Раздел со списком: ключ списка, шаблон элемента и текст для пустого списка
+    list_key: Optional[str] = None
+    item: str = "{item}"
+    empty: Optional[str] = None
+    # Выводить ли заголовок, если в разделе нет ни одной строки
+    always: bool = True
+
+
+@dataclass(frozen=True)
+class _CompiledLine:
+    fields: tuple[str, ...]
+    render: Callable[[dict[str, Any]], str]
+
+
+@dataclass(frozen=True)
+class _CompiledSection:
+    header: str
+    lines: tuple[_CompiledLine, ...]
+    list_key: Optional[str]
+    item: Optional[_CompiledLine]
+    empty: Optional[str]
+    always: bool
+
+
+# Шаблоны отчета по локалям
+REPORT_TEMPLATES: dict[str, dict[str, Any]] = {
+    "ru": {
+        "title": "ПОГОДНЫЙ ОТЧЕТ: {city_name}",
+        "unknown_city": "Неизвестный город",
+        "no_data": "нет данных",
+        "wind_unit": "м/с",
+        "sections": (
+            SectionTemplate(
+                header="📊 ОБЩАЯ ИНФОРМАЦИЯ:",
+                lines=(
+                    "Состояние: {overall_condition}",
+                    "Уровень доверия: {confidence_percent}%",
+                    "Источников данных: {data_sources}",
+                )
+            ),
+            SectionTemplate(
+                header="🌡 ТЕМПЕРАТУРА:",
+                lines=(
+                    "Воздух: {temperature}°C",
+                    "По ощущению: {feels_like}°C",
+                    "Вода: {water_temperature}°C",
+                    "За сутки: {temperature_delta_24h}°C",
+                    "Тренд: {temperature_trend}°C/ч",
+                )
+            ),
+            SectionTemplate(
+                header="💨 ВЕТЕР И ВЛАЖНОСТЬ:",
+                lines=(
+                    "Скорость: {wind_speed} м/с ({wind_description})",
+                    "Влажность: {humidity}%",
+                )
+            ),
+            SectionTemplate(
+                header="📈 АТМОСФЕРНОЕ ДАВЛЕНИЕ:",
+                lines=("{pressure_hpa} гПа ({pressure_mmhg} мм рт.ст.)",)
+            ),
+            SectionTemplate(
+                header="☀ СОЛНЕЧНЫЕ ЧАСЫ:",
+                lines=(
+                    "Восход: {sunrise}",
+                    "Закат: {sunset}",
+                    "Продолжительность дня: {day_length}",
+                )
+            ),
+            SectionTemplate(
+                header="⚡ ГЕОМАГНИТНАЯ АКТИВНОСТЬ:",
+                lines=(
+                    "Уровень: {geomagnetic_activity}/9 баллов",
+                    "Описание: {geomagnetic_description}",
+                ),
+                always=False
+            ),
+            SectionTemplate(
+                header="⏰ БЛИЖАЙШИЙ ПРОГНОЗ:",
+                list_key="next_hours",
+                item="{time}: {temperature}°C{wind}",
+                always=False
+            ),
+            SectionTemplate(
+                header="⚠ ПРЕДУПРЕЖДЕНИЯ:",
+                list_key="warnings",
+                always=False
+            ),
+            SectionTemplate(
+                header="🎯 РЕКОМЕНДАЦИИ:",
+                list_key="recommendations",
+                item="{label}: {item}",
+                empty="Нет специальных рекомендаций"
+            ),
+        ),
+        "recommendation_labels": {
+            "clothing": "Одежда",
+            "activities": "Занятия",
+            "wind_warning": "Ветер",
+            "umbrella": "Зонт",
+            "health_warning": "Самочувствие",
+        },
+    },
+    "en": {
+        "title": "WEATHER REPORT: {city_name}",
+        "unknown_city": "Unknown city",
+        "no_data": "no data",
+        "wind_unit": "m/s",
+        "sections": (
+            SectionTemplate(
+                header="📊 OVERVIEW:",
+                lines=(
+                    "Condition: {overall_condition}",
+                    "Confidence: {confidence_percent}%",
+                    "Data sources: {data_sources}",
+                )
+            ),
+            SectionTemplate(
+                header="🌡 TEMPERATURE:",
+                lines=(
+                    "Air: {temperature}°C",
+                    "Feels like: {feels_like}°C",
+                    "Water: {water_temperature}°C",
+                    "Since yesterday: {temperature_delta_24h}°C",
+                    "Trend: {temperature_trend}°C/h",
+                )
+            ),
+            SectionTemplate(
+                header="💨 WIND AND HUMIDITY:",
+                lines=(
+                    "Speed: {wind_speed} m/s ({wind_description})",
+                    "Humidity: {humidity}%",
+                )
+            ),
+            SectionTemplate(
+                header="📈 PRESSURE:",
+                lines=("{pressure_hpa} hPa ({pressure_mmhg} mmHg)",)
+            ),
+            SectionTemplate(
+                header="☀ DAYLIGHT:",
+                lines=(
+                    "Sunrise: {sunrise}",
+                    "Sunset: {sunset}",
+                    "Day length: {day_length}",
+                )
+            ),
+            SectionTemplate(
+                header="⚡ GEOMAGNETIC ACTIVITY:",
+                lines=(
+                    "Level: {geomagnetic_activity}/9",
+                    "Description: {geomagnetic_description}",
+                ),
+                always=False
+            ),
+            SectionTemplate(
+                header="⏰ NEXT HOURS:",
+                list_key="next_hours",
+                item="{time}: {temperature}°C{wind}",
+                always=False
+            ),
+            SectionTemplate(
+                header="⚠ WARNINGS:",
+                list_key="warnings",
+                always=False
+            ),
+            SectionTemplate(
+                header="🎯 RECOMMENDATIONS:",
+                list_key="recommendations",
+                item="{label}: {item}",
+                empty="No special recommendations"
+            ),
+        ),
+        "recommendation_labels": {
+            "clothing": "Clothing",
+            "activities": "Activities",
+            "wind_warning": "Wind",
+            "umbrella": "Umbrella",
+            "health_warning": "Health",
+        },
+    },
+}
+
+
+# Шаблоны прогноза по дням по локалям
+DAILY_TEMPLATES: dict[str, dict[str, Any]] = {
+    "ru": {
+        "title": "📅 ПРОГНОЗ ПО ДНЯМ: {city_name}",
+        "unknown_city": "Неизвестный город",
+        "weekdays": ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"),
+        "precipitation": ", осадки {precipitation} мм ({pop}%)",
+        "sections": (
+            SectionTemplate(
+                header="🗓 ПО ДНЯМ:",
+                list_key="days",
+                item="{weekday} {date}: {temp_min}…{temp_max}°C, {condition}{precipitation}",
+                empty="Нет данных прогноза"
+            ),
+            SectionTemplate(
+                header="📊 ОБЩАЯ ИНФОРМАЦИЯ:",
+                lines=("Источников данных: {data_sources}",)
+            ),
+        ),
+        # Состояние по коду OpenWeatherMap
+        "conditions": {
+            "Clear": "Ясно \U00002600",
+            "Clouds": "Облачно \U00002601",
+            "Rain": "Дождь \U00002614",
+            "Drizzle": "Дождь \U00002614",
+            "Thunderstorm": "Гроза \U000026A1",
+            "Snow": "Снег \U0001F328",
+            "Mist": "Туман \U0001F32B",
+        },
+    },
+    "en": {
+        "title": "📅 DAILY FORECAST: {city_name}",
+        "unknown_city": "Unknown city",
+        "weekdays": ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"),
+        "precipitation": ", precipitation {precipitation} mm ({pop}%)",
+        "sections": (
+            SectionTemplate(
+                header="🗓 BY DAY:",
+                list_key="days",
+                item="{weekday} {date}: {temp_min}…{temp_max}°C, {condition}{precipitation}",
+                empty="No forecast data"
+            ),
+            SectionTemplate(
+                header="📊 OVERVIEW:",
+                lines=("Data sources: {data_sources}",)
+            ),
+        ),
+        "conditions": {
+            "Clear": "Clear \U00002600",
+            "Clouds": "Clouds \U00002601",
+            "Rain": "Rain \U00002614",
+            "Drizzle": "Drizzle \U00002614",
+            "Thunderstorm": "Thunderstorm \U000026A1",
+            "Snow": "Snow \U0001F328",
+            "Mist": "Mist \U0001F32B",
+        },
+    },
+}
+
+# Шаблоны по видам отчетов
+TEMPLATES_BY_KIND: dict[str, dict[str, dict[str, Any]]] = {
+    REPORT_CURRENT: REPORT_TEMPLATES,
+    REPORT_DAILY: DAILY_TEMPLATES,
+}
+
+
+def report_digest(merged_data: dict) -> str:
+    """
+    Дайджест объединенного отчета - ключ версии данных
+    """
+
+    payload = json.dumps(
+        merged_data,
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _compile_line(template: str) -> _CompiledLine:
+    fields = tuple(
+        field_name
+        for _, field_name, _, _ in Formatter().parse(template)
+        if field_name
+    )
+    return _CompiledLine(fields=fields, render=template.format_map)
+
+
+class ReportRenderer:
+    def __init__(self, max_entries: int = 512) -> None:
+        # Скомпилированные шаблоны по (вид отчета, локаль, формат)
+        self._compiled: dict[tuple[str, str, str], tuple[Any, ...]] = {}
+        # Мемоизация: (дайджест, локаль, формат) -> готовый текст
+        self._memo: OrderedDict[tuple[str, str, str], str] = OrderedDict()
+        self.max_entries = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        # Источник готовых текстов, которых нет в памяти (снимок прошлого запуска)
+        self.restore: Optional[Callable[[tuple[str, str, str]], Optional[str]]] = None
+
+        for kind, by_locale in TEMPLATES_BY_KIND.items():
+            for locale in by_locale:
+                for fmt in (FORMAT_TEXT, FORMAT_HTML):
+                    self._compiled[(kind, locale, fmt)] = self._compile(kind, locale, fmt)
+
+    def _compile(self, kind: str, locale: str, fmt: str) -> tuple[Any, ...]:
+        """
+        Предварительная компиляция шаблонов для вида отчета, локали и формата
+        """
+
+        templates = TEMPLATES_BY_KIND[kind][locale]
+
+        def header(text: str) -> str:
+            if fmt == FORMAT_HTML:
+                return f"<b>{html.escape(text)}</b>"
+            return text
+
+        sections: list[_CompiledSection] = []
+        for section in templates["sections"]:
+            sections.append(_CompiledSection(
+                header=header(section.header),
+                lines=tuple(_compile_line(line) for line in section.lines),
+                list_key=section.list_key,
+                item=_compile_line(section.item) if section.list_key else None,
+                empty=section.empty,
+                always=section.always
+            ))
+
+        title = _compile_line(templates["title"])
+        if fmt == FORMAT_HTML:
+            title = _compile_line(f"<b>{templates['title']}</b>")
+
+        return title, tuple(sections)
+
+    def _prepare(self, merged_data: dict, locale: str, fmt: str) -> dict[str, Any]:
+        """
+        Подготовка плоского словаря значений для подстановки в шаблоны
+        """
+
+        templates = REPORT_TEMPLATES[locale]
+        no_data = templates["no_data"]
+        values: dict[str, Any] = {}
+
+        for key in (
+            "temperature", "feels_like", "water_temperature",
+            "wind_speed", "humidity", "pressure_hpa",
+            "sunrise", "sunset", "day_length", "geomagnetic_activity",
+        ):
+            if merged_data.get(key) is not None:
+                values[key] = merged_data[key]
+
+        for key in ("temperature_delta_24h", "temperature_trend"):
+            if merged_data.get(key) is not None:
+                values[key] = f"{merged_data[key]:+}"
+
+        values["city_name"] = merged_data.get("city_name", templates["unknown_city"])
+        values["overall_condition"] = merged_data.get("overall_condition", no_data)
+        values["confidence_percent"] = f"{merged_data.get('confidence_score', 0) * 100:.0f}"
+        values["data_sources"] = merged_data.get("data_sources", 0)
+
+        if "wind_speed" in values:
+            values["wind_description"] = merged_data.get("wind_description", no_data)
+        if "pressure_hpa" in values:
+            values["pressure_mmhg"] = merged_data.get("pressure_mmhg", "?")
+        if "sunrise" not in values:
+            # Без восхода раздел о солнце не выводится целиком
+            for key in ("sunset", "day_length"):
+                values.pop(key, None)
+        if "geomagnetic_activity" in values:
+            values["geomagnetic_description"] = merged_data.get(
+                "geomagnetic_description",
+                no_data
+            )
+
+        if fmt == FORMAT_HTML:
+            values = {
+                key: html.escape(str(value))
+                for key, value in values.items()
+            }
+
+        escape: Callable[[Any], Any] = (
+            (lambda value: html.escape(str(value)))
+            if fmt == FORMAT_HTML
+            else (lambda value: value)
+        )
+
+        values["warnings"] = [
+            {"item": escape(warning)}
+            for warning in merged_data.get("warnings") or []
+        ]
+
+        # Почасовой прогноз приходит уже ограниченным окном
+        values["next_hours"] = [
+            {
+                "time": escape(point["time"]),
+                "temperature": escape(point.get("temperature", "?")),
+                "wind": (
+                    f", {escape(point['wind'])} {templates['wind_unit']}"
+                    if point.get("wind") is not None
+                    else ""
+                )
+            }
+            for point in merged_data.get("next_hours") or []
+        ]
+
+        labels = templates["recommendation_labels"]
+        values["recommendations"] = [
+            {
+                "label": escape(labels.get(key, key.replace("_", " ").title())),
+                "item": escape(value)
+            }
+            for key, value in (merged_data.get("recommendations") or {}).items()
+        ]
+
+        return values
+
+    def _prepare_daily(self, merged_data: dict, locale: str, fmt: str) -> dict[str, Any]:
+        """
+        Значения для шаблонов прогноза по дням
+        """
+
+        templates = DAILY_TEMPLATES[locale]
+        escape: Callable[[Any], str] = (
+            (lambda value: html.escape(str(value)))
+            if fmt == FORMAT_HTML
+            else str
+        )
+
+        values: dict[str, Any] = {
+            "city_name": escape(merged_data.get("city_name", templates["unknown_city"])),
+            "data_sources": merged_data.get("data_sources", 1),
+        }
+
+        days: list[dict[str, str]] = []
+        for day in merged_data.get("days") or []:
+            precipitation = ""
+            if day["precipitation"] > 0:
+                precipitation = templates["precipitation"].format(
+                    precipitation=f"{day['precipitation']:g}",
+                    pop=f"{day['pop'] * 100:.0f}"
+                )
+            days.append({
+                "weekday": templates["weekdays"][day["weekday"]],
+                "date": f"{day['date'][8:10]}.{day['date'][5:7]}",
+                "temp_min": f"{day['temp_min']:+g}",
+                "temp_max": f"{day['temp_max']:+g}",
+                "condition": escape(templates["conditions"].get(day["condition"], day["condition"])),
+                "precipitation": precipitation,
+            })
+        values["days"] = days
+
+        return values
+
+    def _render(self, merged_data: dict, kind: str, locale: str, fmt: str) -> str:
+        title, sections = self._compiled[(kind, locale, fmt)]
+        if kind == REPORT_DAILY:
+            values = self._prepare_daily(merged_data, locale, fmt)
+        else:
+            values = self._prepare(merged_data, locale, fmt)
+
+        parts: list[str] = [title.render(values), "\n"]
+
+        for section in sections:
+            body: list[str] = []
+
+            for line in section.lines:
+                if all(field in values for field in line.fields):
+                    body.append(f"   • {line.render(values)}\n")
+
+            if section.list_key is not None:
+                items = values.get(section.list_key) or []
+                for item in items:
+                    body.append(f"   • {section.item.render(item)}\n")
+                if not items and section.empty:
+                    body.append(f"   • {section.empty}\n")
+
+            if body or section.always:
+                parts.append(f"\n{section.header}\n")
+                parts.extend(body)
+
+        return "".join(parts)
+
+    def items(self) -> list[tuple[tuple[str, str, str], str]]:
+        return list(self._memo.items())
+
+    def render(
+        self,
+        merged_data: dict,
+        locale: str = DEFAULT_LOCALE,
+        fmt: str = FORMAT_TEXT,
+        digest: Optional[str] = None,
+        kind: str = REPORT_CURRENT
+    ) -> str:
+        """
+        Отрисовка отчета с мемоизацией по дайджесту данных
+
+        Данные разных видов отчетов различаются, поэтому различаются
+        и их дайджесты - общая мемоизация им не мешает
+        """
+
+        if (kind, locale, fmt) not in self._compiled:
+            locale = DEFAULT_LOCALE
+        if (kind, locale, fmt) not in self._compiled:
+            fmt = FORMAT_TEXT
+
+        key = (digest or report_digest(merged_data), locale, fmt)
+
+        cached = self._memo.get(key)
+        if cached is not None:
+            self._memo.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        text = self.restore(key) if self.restore is not None else None
+        if text is None:
+            text = self._render(merged_data, kind, locale, fmt)
+
+        self._memo[key] = text
+        if len(self._memo) > self.max_entries:
+            self._memo.popitem(last=False)
+
+        return text
+
+
+# Строки таблицы сравнения: подпись и поле объединенного отчета
+COMPARISON_ROWS: tuple[tuple[str, str, str], ...] = (
+    ("Темп., °C", "temperature", "{:g}"),
+    ("Ощущ., °C", "feels_like", "{:g}"),
+    ("Ветер, м/с", "wind_speed", "{:g}"),
+    ("Влажн., %", "humidity", "{}"),
+    ("Давл., мм", "pressure_mmhg", "{}"),
+)
+# Ширина колонки города в таблице сравнения
+COMPARISON_COLUMN_WIDTH = 10
+
+
+def render_comparison(columns: list[tuple[str, Optional[dict]]]) -> str:
+    """
+    Компактная таблица сравнения городов для моноширинного вывода (HTML)
+
+    columns - пары (город, объединенный отчет или None, если не успел)
+    """
+
+    width = COMPARISON_COLUMN_WIDTH
+    label_width = max(len(label) for label, _, _ in COMPARISON_ROWS)
+
+    def cell(value: Any) -> str:
+        text = str(value)
+        if len(text) > width - 1:
+            text = text[:width - 2] + "…"
+        return text.rjust(width)
+
+    lines = [" " * label_width + "".join(cell(city) for city, _ in columns)]
+    for label, field, value_format in COMPARISON_ROWS:
+        row = [label.ljust(label_width)]
+        for _, merged_data in columns:
+            value = (merged_data or {}).get(field)
+            row.append(cell(value_format.format(value) if value is not None else "—"))
+        lines.append("".join(row))
+
+    conditions = [
+        f"{city}: {merged_data.get('overall_condition', '—')}"
+        if merged_data is not None
+        else f"{city}: нет данных"
+        for city, merged_data in columns
+    ]
+
+    table = html.escape("\n".join(lines))
+    return (
+        f"<b>📊 Сравнение погоды</b>\n<pre>{table}</pre>\n"
+        + html.escape("\n".join(conditions))
+    )
+
+
+# Глобальный экземпляр отрисовщика отчетов
+report_renderer = ReportRenderer()
@@ -1,74 +1,163 @@
+from datetime import datetime
+from functools import lru_cache
 import logging
+from typing import Iterable, Mapping, Optional
+from zoneinfo import ZoneInfo
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
-
-from aiogram import Bot
-
-from config import subscribed_users, user_cities, TIMEZONE
-from services.weather import weather_service
+from config import TIMEZONE
+from services.broadcast_cache import broadcast_cache
+from services.broadcast_journal import BroadcastRun, get_broadcast_journal
+from services.forecast import get_forecast_service
+from services.outbox import get_outbox, get_outbox_workers
+from services.quota import PRIORITY_BROADCAST, get_quota, priority
+from services.subscriptions import sync_subscriptions
 
 logger = logging.getLogger(__name__)
 
+# Сколько отправок фиксировать в журнале одной контрольной точкой
+CHECKPOINT_BATCH = 50
+
 
 class SchedulerService:
     def __init__(self):
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
         self.scheduler = AsyncIOScheduler()
+        # Запуски рассылки, которые сейчас выполняются в этом процессе
+        self._active_runs: set[str] = set()
     
-    async def send_daily_weather(self, bot: Bot) -> None:
+    async def send_daily_weather(self) -> None:
         """Отправка ежедневной рассылки погоды"""
         logger.info("Запуск ежедневной рассылки погоды...")
-        
-        if not subscribed_users:
+
+        # Окно рассылки - одно на запуск задачи
+        window = datetime.now(ZoneInfo(TIMEZONE)).strftime("%Y-%m-%dT%H:%M")
+
+        journal = get_broadcast_journal()
+        run = journal.get_run(window)
+        if run is not None:
+            if run.status == "finished":
+                logger.info(f"Рассылка окна {window} уже выполнена")
+                return
+            logger.info(f"Продолжаем рассылку {run.run_id} окна {window}")
+            await self._deliver_run(run, journal.pending(run.run_id))
+            return
+
+        # Подписки ведет процесс бота - базу перечитываем, только если
+        # ее версия изменилась. Неизменяемый снимок: подписки во время
+        # рассылки его не меняют
+        snapshot = sync_subscriptions().snapshot()
+        if not snapshot.by_city:
             logger.info("Нет подписанных пользователей для рассылки")
             return
+
+        # Снимок получателей фиксируется в журнале при старте запуска,
+        # а рассылка идет по индексу город -> пользователи без перегруппировки
+        run = journal.start_run(window, snapshot.by_city)
+        await self._deliver_run(run, snapshot.by_city)
+
+    async def resume_unfinished(self) -> None:
+        """Продолжение прерванной рассылки после перезапуска"""
+        run = get_broadcast_journal().unfinished()
+        if run is None:
+            return
+
+        logger.info(f"🔁 Продолжаем прерванную рассылку {run.run_id} окна {run.window}")
+        await self._deliver_run(run, get_broadcast_journal().pending(run.run_id))
+
+    async def _deliver_run(
+        self,
+        run: BroadcastRun,
+        users_by_city: Mapping[str, Iterable[int]]
+    ) -> None:
+        """Постановка в очередь оставшихся получателей с контрольными точками"""
+        if run.run_id in self._active_runs:
+            logger.info(f"Рассылка {run.run_id} уже выполняется")
+            return
+
+        self._active_runs.add(run.run_id)
+        try:
+            await self._deliver_pending(run, users_by_city)
+        finally:
+            self._active_runs.discard(run.run_id)
+
+    async def _deliver_pending(
+        self,
+        run: BroadcastRun,
+        users_by_city: Mapping[str, Iterable[int]]
+    ) -> None:
+        journal = get_broadcast_journal()
+        outbox = get_outbox()
+        outbox_workers = get_outbox_workers()
+
+        enqueued_count: int = 0
+        failed_count: int = 0
+        # Пачка сообщений до следующей контрольной точки
+        batch: list[tuple[int, str, Optional[str]]] = []
+
+        def flush() -> None:
+            # Ключ дедупликации защищает от повторной постановки при продолжении
+            outbox.enqueue_many(batch)
+            journal.checkpoint(run.run_id, [chat_id for chat_id, _, _ in batch])
+            outbox_workers.notify()
+            batch.clear()
+
+        # Города без свежего прогноза загружаем заранее одной пачкой
+        forecast_service = get_forecast_service()
+        missing = [
+            city for city in users_by_city
+            if broadcast_cache.get(city, run.window) is None
+            and forecast_service.cached(city) is None
+        ]
+        if missing:
+            with priority(PRIORITY_BROADCAST):
+                await forecast_service.refresh_many(missing)
         
-        success_count: int = 0
-        error_count: int = 0
-        
-        # Создаем копию чтобы избежать изменения во время итерации
-        users_to_process = subscribed_users.copy()
-        
-        for user_id in users_to_process:
-            try:
-                # Получаем город пользователя
-                city = user_cities.get(user_id, "Иркутск")
-                
-                # Получаем прогноз погоды
-                weather_text = await weather_service.get_weather_forecast(city)
-                
-                if weather_text:
-                    await bot.send_message(
-                        user_id, 
-                        f"🌅 Доброе утро! Ваша ежедневная рассылка погоды:\n\n{weather_text}\n\n"
-                        f"💡 Чтобы отписаться: /unsubscribe"
-                    )
-                    success_count += 1
-                    logger.debug(f"✅ Погода отправлена пользователю {user_id} для города {city}")
+        # Отчет отрисовывается один раз на город
+        for city, user_ids in users_by_city.items():
+            payload = await broadcast_cache.get_or_build(
+                city,
+                run.window,
+                lambda: self._build_weather_text(city)
+            )
+            if not payload.ok:
+                logger.warning(f"Не удалось получить погоду для города {city}")
+
+            for user_id in user_ids:
+                batch.append((user_id, payload.text, f"{run.run_id}:{user_id}"))
+                broadcast_cache.record_send(payload)
+                if payload.ok:
+                    enqueued_count += 1
                 else:
-                    # Если не удалось получить погоду для города
-                    await bot.send_message(
-                        user_id,
-                        f"❌ Не удалось получить погоду для города {city}."
-                        "Проверьте правильность названия.\n"
-                        f"Используйте /subscribe чтобы изменить город."
-                    )
-                    error_count += 1                    
-            except Exception as e:
-                error_count += 1
-                logger.error(f"❌ Ошибка отправки пользователю {user_id}: {e}")
-                
-                # Если пользователь заблокировал бота, удаляем из подписок
-                if "bot was blocked" in str(e).lower() or "Forbidden" in str(e):
-                    subscribed_users.discard(user_id)
-                    if user_id in user_cities:
-                        del user_cities[user_id]
-                    logger.info(f"🗑️ Пользователь {user_id} удален из подписок")
-
-        logger.info(f"📊 Рассылка завершена. Успешно: {success_count}, Ошибок: {error_count}")
-
-    def setup_schedule(self, bot: Bot):
+                    failed_count += 1
+
+                if len(batch) >= CHECKPOINT_BATCH:
+                    flush()
+
+        flush()
+        journal.finish(run.run_id)
+
+        logger.info(
+            f"📊 Рассылка {run.run_id} поставлена в очередь. "
+            f"С прогнозом: {enqueued_count}, без прогноза: {failed_count}"
+        )
+        logger.info(f"📦 Отправок на город: {broadcast_cache.stats(run.window)}")
+        logger.info(f"🚦 Очереди к источникам: {get_quota().stats()}")
+
+    async def _build_weather_text(self, city: str) -> Optional[str]:
+        """Получение и отрисовка отчета о погоде для города"""
+        forecast_service = get_forecast_service()
+        # Рассылка уступает квоту источников интерактивным запросам
+        with priority(PRIORITY_BROADCAST):
+            forecast = await forecast_service.get(city)
+        if forecast is None:
+            return None
+        return forecast_service.render(forecast)
+
+    def setup_schedule(self):
         """Настройка расписания"""
+        from apscheduler.triggers.cron import CronTrigger
+
         # Основная рассылка каждый день в 8:00
         self.scheduler.add_job(
             self.send_daily_weather,
@@ -76,8 +165,7 @@ class SchedulerService:
                 hour=9,
                 minute=0, 
                 timezone=TIMEZONE
-            ),
-            args=[bot]
+            )
         )
 
         # Для тестирования - каждые 2 минуты
@@ -85,10 +173,13 @@ class SchedulerService:
             self.send_daily_weather,
             trigger='interval',
             minutes=2,
-            args=[bot],
             id='test_schedule'
         )
     
+    def schedule_resume(self):
+        """Однократная задача продолжения прерванной рассылки"""
+        self.scheduler.add_job(self.resume_unfinished, id="resume_broadcast")
+
     def start(self):
         """Запуск планировщика"""
         self.scheduler.start()
@@ -100,5 +191,14 @@ class SchedulerService:
         logger.info("Планировщик остановлен")
 
 
-# Глобальный экземпляр планировщика
-scheduler_service = SchedulerService()
+@lru_cache(maxsize=None)
+def get_scheduler_service() -> SchedulerService:
+    """Глобальный экземпляр планировщика"""
+    return SchedulerService()
+
+
+def __getattr__(name: str):
+    # Глобальный экземпляр создается лениво, при первом обращении
+    if name == "scheduler_service":
+        return get_scheduler_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
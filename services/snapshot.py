@@ -0,0 +1,130 @@
+import math
+import mmap
+import os
+import struct
+import time
+from typing import Iterable, Iterator, Optional
+
+# Файл снимка: заголовок, каталог разделов, затем записи разделов.
+# Индекс записей фиксированного размера читается при открытии,
+# а сами данные берутся из отображенного в память файла по запросу
+MAGIC = b"WXSNAP01"
+HEADER = struct.Struct("<8sHHd")
+# Раздел: код, число записей, смещение индекса
+SECTION = struct.Struct("<HxxIQ")
+# Запись: срок годности, смещение ключа, длина ключа, длина данных
+ENTRY = struct.Struct("<dQHI")
+
+SECTION_FORECASTS = 1
+SECTION_REPORTS = 2
+SECTION_POPULARITY = 3
+SECTION_DAILY = 4
+
+# Запись без срока годности
+NO_EXPIRY = math.inf
+
+
+def write_snapshot(
+    path: str,
+    sections: dict[int, Iterable[tuple[str, float, bytes]]]
+) -> int:
+    """
+    Записать снимок атомарно; возвращает число записей
+    """
+
+    materialized = {code: list(entries) for code, entries in sections.items()}
+
+    # Индексы всех разделов идут подряд сразу за каталогом, данные - после них
+    index_offset = HEADER.size + SECTION.size * len(materialized)
+    data_offset = index_offset + ENTRY.size * sum(len(e) for e in materialized.values())
+
+    directory = bytearray()
+    index = bytearray()
+    data = bytearray()
+    total = 0
+    for code, entries in materialized.items():
+        directory += SECTION.pack(code, len(entries), index_offset + len(index))
+        for key, expires_at, payload in entries:
+            key_bytes = key.encode("utf-8")
+            index += ENTRY.pack(expires_at, data_offset + len(data), len(key_bytes), len(payload))
+            data += key_bytes
+            data += payload
+            total += 1
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, 1, len(materialized), time.time()))
+        file.write(directory)
+        file.write(index)
+        file.write(data)
+    os.replace(tmp_path, path)
+    return total
+
+
+class Snapshot:
+    """
+    Снимок, открытый только для чтения через mmap
+
+    Просроченные записи отбрасываются при чтении индекса
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        self._view = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        # Раздел -> ключ -> (срок годности, смещение данных, длина данных)
+        self._index: dict[int, dict[str, tuple[float, int, int]]] = {}
+
+        magic, _, section_count, self.created_at = HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Файл {path} не является снимком")
+
+        now = time.time()
+        for number in range(section_count):
+            code, count, offset = SECTION.unpack_from(
+                self._view, HEADER.size + number * SECTION.size
+            )
+            entries: dict[str, tuple[float, int, int]] = {}
+            for expires_at, key_offset, key_length, length in ENTRY.iter_unpack(
+                self._view[offset:offset + count * ENTRY.size]
+            ):
+                if expires_at <= now:
+                    continue
+                key = self._view[key_offset:key_offset + key_length].decode("utf-8")
+                entries[key] = (expires_at, key_offset + key_length, length)
+            self._index[code] = entries
+
+    @classmethod
+    def open(cls, path: str) -> Optional["Snapshot"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._index.values())
+
+    def keys(self, section: int) -> Iterator[str]:
+        return iter(self._index.get(section, {}))
+
+    def get(self, section: int, key: str) -> Optional[tuple[float, bytes]]:
+        """
+        Данные записи и ее срок годности, если она еще не просрочена
+        """
+
+        found = self._index.get(section, {}).get(key)
+        if found is None:
+            return None
+
+        expires_at, offset, length = found
+        if expires_at <= time.time():
+            return None
+        return expires_at, self._view[offset:offset + length]
+
+    def close(self) -> None:
+        self._view.close()
+        self._file.close()
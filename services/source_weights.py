@@ -0,0 +1,256 @@
+from functools import lru_cache
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from config import DATA_DIR
+from services.process_lock import ProcessLock
+
+# Характерная погрешность по полям - масштаб для весов и уровня доверия
+FIELD_TOLERANCES: dict[str, float] = {
+    "temperature": 2.0,  # °C
+    "humidity": 15.0,    # %
+    "pressure": 20.0,    # гПа
+    "wind": 3.0,         # м/с
+}
+
+
+class AdaptiveSourceWeights:
+    """
+    Веса источников по тому, насколько их прогноз сбылся
+
+    Каждый источник оценивается по своему прошлому прогнозу на текущий
+    час против наблюдения - текущих данных OpenWeatherMap, которые
+    строятся по метеостанциям. Эталон не зависит от самих весов,
+    поэтому смещенный источник теряет вес, а не закрепляет его
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sources: tuple[str, ...] = ("source1", "source2"),
+        reference: str = "source1",
+        alpha: float = 0.1,
+        horizon: float = 6 * 3600,
+        match_window: float = 1800,
+        save_every: int = 20
+    ) -> None:
+        self.path = path
+        self.sources = sources
+        # Источник текущих наблюдений
+        self.reference = reference
+        # Коэффициент сглаживания EWMA
+        self.alpha = alpha
+        # На сколько вперед запоминаются прогнозы и насколько точно
+        # их время должно совпасть со временем наблюдения (секунды)
+        self.horizon = horizon
+        self.match_window = match_window
+        self.save_every = save_every
+        # поле -> источник -> EWMA абсолютной ошибки прогноза
+        self._errors: dict[str, dict[str, float]] = {}
+        # Ошибки на момент последнего чтения или записи файла: по разнице
+        # с ними при сохранении видно, что изменил этот процесс
+        self._base: dict[str, dict[str, float]] = {}
+        # (город, поле, источник) -> время -> ожидаемое значение
+        self._forecasts: dict[tuple[str, str, str], dict[float, float]] = {}
+        self._pending: int = 0
+        # Объединение данных идет в рабочих потоках
+        self._lock = threading.RLock()
+        self.load()
+
+    def _read(self) -> dict[str, dict[str, float]]:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self) -> None:
+        with self._lock:
+            self._errors = self._read()
+            self._base = {field: dict(errors) for field, errors in self._errors.items()}
+
+    def save(self) -> None:
+        """
+        Атомарная запись весов на диск
+
+        Веса учат и бот, и планировщик: под межпроцессной блокировкой
+        изменения этого процесса накладываются на то, что уже в файле
+        """
+
+        with self._lock, ProcessLock(f"{self.path}.lock"):
+            merged = self._read()
+            for field, errors in self._errors.items():
+                stored = merged.setdefault(field, {})
+                base = self._base.get(field, {})
+                for source, error in errors.items():
+                    if source not in stored:
+                        stored[source] = error
+                    elif source not in base:
+                        # Оба процесса начали с нуля - берем среднее
+                        stored[source] = (stored[source] + error) / 2
+                    else:
+                        stored[source] = max(0.0, stored[source] + error - base[source])
+
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            # Временный файл свой у каждого процесса
+            descriptor, tmp_path = tempfile.mkstemp(
+                dir=directory,
+                prefix=f"{os.path.basename(self.path)}.",
+                suffix=".tmp"
+            )
+            try:
+                with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                    json.dump(merged, file)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+            self._errors = merged
+            self._base = {field: dict(errors) for field, errors in merged.items()}
+            self._pending = 0
+
+    def weights(self, field: str) -> dict[str, float]:
+        """
+        Нормированные веса источников для поля
+        """
+
+        errors = self._errors.get(field, {})
+        floor = FIELD_TOLERANCES.get(field, 1.0) * 0.1
+
+        raw = {
+            source: 1.0 / (errors[source] + floor) if source in errors else None
+            for source in self.sources
+        }
+        known = [value for value in raw.values() if value is not None]
+        if not known:
+            return {source: 1.0 / len(self.sources) for source in self.sources}
+
+        # Источник без истории получает средний вес
+        default = sum(known) / len(known)
+        total = sum(default if value is None else value for value in raw.values())
+        return {
+            source: (default if value is None else value) / total
+            for source, value in raw.items()
+        }
+
+    def weight(self, source: str, field: str) -> float:
+        return self.weights(field)[source]
+
+    def reliability(self, field: str) -> float:
+        """
+        Качество данных по полю в (0, 1]: 1 - источники близки к консенсусу
+        """
+
+        errors = self._errors.get(field)
+        if not errors:
+            return 1.0
+
+        weights = self.weights(field)
+        error = sum(weights[source] * errors.get(source, 0.0) for source in self.sources)
+        return 1.0 / (1.0 + error / FIELD_TOLERANCES.get(field, 1.0))
+
+    def remember(
+        self,
+        city: str,
+        field: str,
+        source: str,
+        forecast: list[tuple[float, float]],
+        now: Optional[float] = None
+    ) -> None:
+        """
+        Запомнить прогноз источника, чтобы потом сверить его с наблюдением
+
+        На каждый час остается самый ранний прогноз - так оценивается
+        прогноз, а не пересказ только что наблюденного
+        """
+
+        now = time.time() if now is None else now
+        with self._lock:
+            stored = self._forecasts.setdefault((city, field, source), {})
+            expired = [timestamp for timestamp in stored if timestamp < now - self.match_window]
+            for timestamp in expired:
+                del stored[timestamp]
+            for timestamp, value in forecast:
+                if now < timestamp <= now + self.horizon and not math.isnan(value):
+                    stored.setdefault(timestamp, value)
+
+    def _due_forecast(self, city: str, field: str, source: str, now: float) -> Optional[float]:
+        stored = self._forecasts.get((city, field, source))
+        if not stored:
+            return None
+
+        nearest = min(stored, key=lambda timestamp: abs(timestamp - now))
+        if abs(nearest - now) > self.match_window:
+            return None
+        # Прогноз на этот час сверяется один раз
+        return stored.pop(nearest)
+
+    def update(
+        self,
+        city: str,
+        field: str,
+        values: dict[str, Optional[float]],
+        now: Optional[float] = None
+    ) -> None:
+        """
+        Учесть новые показания: O(1) на источник
+        """
+
+        now = time.time() if now is None else now
+        tolerance = FIELD_TOLERANCES.get(field, 1.0)
+        present = {
+            source: value
+            for source, value in values.items()
+            if value is not None and not math.isnan(value)
+        }
+        observed = present.get(self.reference)
+
+        with self._lock:
+            deviations: dict[str, float] = {}
+            for source in self.sources:
+                if source not in present:
+                    # Пропуск или мусор в ответе источника - штраф в размере допуска
+                    deviations[source] = tolerance
+                    continue
+                if observed is None:
+                    continue
+                expected = self._due_forecast(city, field, source, now)
+                if expected is not None:
+                    deviations[source] = abs(expected - observed)
+
+            if not deviations:
+                return
+
+            errors = self._errors.setdefault(field, {})
+            for source, deviation in deviations.items():
+                previous = errors.get(source)
+                errors[source] = deviation if previous is None else (
+                    (1 - self.alpha) * previous + self.alpha * deviation
+                )
+
+            self._pending += 1
+            if self._pending >= self.save_every:
+                self.save()
+
+
+@lru_cache(maxsize=None)
+def get_source_weights() -> AdaptiveSourceWeights:
+    """
+    Глобальные адаптивные веса источников
+    """
+
+    return AdaptiveSourceWeights(os.path.join(DATA_DIR, "source_weights.json"))
+
+
+def __getattr__(name: str):
+    # Глобальный экземпляр создается лениво, при первом обращении
+    if name == "source_weights":
+        return get_source_weights()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,89 @@
+import math
+from typing import Generic, Optional, TypeVar
+
+EARTH_RADIUS_KM = 6371.0
+
+T = TypeVar("T")
+
+
+def _to_unit_vector(latitude: float, longitude: float) -> tuple[float, float, float]:
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    return (
+        math.cos(lat) * math.cos(lon),
+        math.cos(lat) * math.sin(lon),
+        math.sin(lat)
+    )
+
+
+class _Node:
+    __slots__ = ("point", "item", "axis", "left", "right")
+
+    def __init__(self, point, item, axis, left, right) -> None:
+        self.point = point
+        self.item = item
+        self.axis = axis
+        self.left = left
+        self.right = right
+
+
+class KDTree(Generic[T]):
+    """
+    k-d дерево по точкам на единичной сфере
+
+    Хорда между точками монотонна по расстоянию по поверхности, поэтому
+    ближайшая по хорде точка - ближайшая и по карте
+    """
+
+    def __init__(self, items: list[tuple[float, float, T]]) -> None:
+        points = [
+            (_to_unit_vector(latitude, longitude), item)
+            for latitude, longitude, item in items
+        ]
+        self._root = self._build(points, 0)
+
+    def _build(self, points: list, depth: int) -> Optional[_Node]:
+        if not points:
+            return None
+
+        axis = depth % 3
+        points.sort(key=lambda point: point[0][axis])
+        middle = len(points) // 2
+        return _Node(
+            point=points[middle][0],
+            item=points[middle][1],
+            axis=axis,
+            left=self._build(points[:middle], depth + 1),
+            right=self._build(points[middle + 1:], depth + 1)
+        )
+
+    def nearest(self, latitude: float, longitude: float) -> Optional[tuple[T, float]]:
+        """
+        Ближайший объект и расстояние до него в километрах
+        """
+
+        if self._root is None:
+            return None
+
+        target = _to_unit_vector(latitude, longitude)
+        best: list = [None, math.inf]
+
+        def search(node: Optional[_Node]) -> None:
+            if node is None:
+                return
+
+            distance = sum((a - b) ** 2 for a, b in zip(node.point, target))
+            if distance < best[1]:
+                best[0], best[1] = node.item, distance
+
+            delta = target[node.axis] - node.point[node.axis]
+            near, far = (node.left, node.right) if delta < 0 else (node.right, node.left)
+            search(near)
+            # Дальнюю ветку смотрим, только если она может быть ближе
+            if delta ** 2 < best[1]:
+                search(far)
+
+        search(self._root)
+
+        chord = math.sqrt(best[1])
+        return best[0], 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
@@ -0,0 +1,67 @@
+import re
+import subprocess
+import sys
+import time
+from typing import Callable
+
+# Строка вывода -X importtime: "import time: self [us] | cumulative | imported package"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_imports(module: str = "main", top: int = 15) -> list[str]:
+    """
+    Холодный импорт модуля в отдельном процессе с -X importtime
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+
+    # Собственное время импорта по пакетам верхнего уровня
+    by_package: dict[str, int] = {}
+    total: int = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + int(self_us)
+        # Полное время импорта самого модуля
+        if name == module and len(indent) == 1:
+            total = int(cumulative_us)
+
+    lines = [f"Импорт {module}: {total / 1000:.1f} мс"]
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"   • {package}: {self_us / 1000:.1f} мс")
+    if result.returncode != 0:
+        lines.append(f"Ошибка импорта: {result.stderr.strip().splitlines()[-1]}")
+    return lines
+
+
+def measure_construction(factories: dict[str, Callable[[], object]]) -> list[str]:
+    """
+    Время ленивого создания сервисов при первом обращении
+    """
+
+    lines = ["Создание сервисов:"]
+    for name, factory in factories.items():
+        started = time.perf_counter()
+        try:
+            factory()
+        except Exception as e:
+            # Например, нет .env - отчет все равно нужен целиком
+            lines.append(f"   • {name}: ошибка - {type(e).__name__}: {e}")
+            continue
+        lines.append(f"   • {name}: {(time.perf_counter() - started) * 1000:.1f} мс")
+    return lines
+
+
+def startup_report(factories: dict[str, Callable[[], object]]) -> str:
+    """
+    Отчет о том, куда уходит время запуска
+    """
+
+    return "\n".join(measure_imports() + [""] + measure_construction(factories))
@@ -0,0 +1,30 @@
+from functools import lru_cache
+import os
+import sqlite3
+
+from config import DATA_DIR
+
+# Общая локальная база бота
+DB_PATH = os.path.join(DATA_DIR, "bot.sqlite3")
+
+
+def connect(path: str = DB_PATH, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Подключение к локальной SQLite-базе
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=check_same_thread)
+    # WAL позволяет читать базу во время записи
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+@lru_cache(maxsize=None)
+def get_connection() -> sqlite3.Connection:
+    """
+    Общее подключение процесса к локальной базе
+    """
+
+    return connect()
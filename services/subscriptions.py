@@ -0,0 +1,267 @@
+from dataclasses import dataclass
+from functools import lru_cache
+import sqlite3
+import threading
+import time
+from types import MappingProxyType
+from typing import Iterable, Mapping, Optional
+
+from services.storage import get_connection
+
+
+class SubscriptionStore:
+    """
+    Подписки в общей локальной базе - их видят и бот, и планировщик
+    """
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS subscriptions (
+                    chat_id INTEGER PRIMARY KEY,
+                    city TEXT NOT NULL,
+                    subscribed_at REAL NOT NULL
+                )
+            """)
+            # Версия подписок: ее меняет каждое изменение из любого процесса.
+            # PRAGMA data_version не подходит - база общая, и он меняется
+            # от записей журнала рассылки, очереди отправки и квот
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS subscriptions_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    version INTEGER NOT NULL
+                )
+            """)
+            self.connection.execute(
+                "INSERT OR IGNORE INTO subscriptions_version (id, version) VALUES (0, 0)"
+            )
+
+    def all(self) -> tuple[int, list[tuple[int, str]]]:
+        """
+        Все подписки и их версия одним чтением
+        """
+
+        with self.connection:
+            self.connection.execute("BEGIN")
+            version = self.version()
+            rows = self.connection.execute(
+                "SELECT chat_id, city FROM subscriptions ORDER BY city, chat_id"
+            ).fetchall()
+        return version, rows
+
+    def version(self) -> int:
+        return self.connection.execute(
+            "SELECT version FROM subscriptions_version WHERE id = 0"
+        ).fetchone()[0]
+
+    def _bump(self) -> int:
+        self.connection.execute(
+            "UPDATE subscriptions_version SET version = version + 1 WHERE id = 0"
+        )
+        return self.version()
+
+    def subscribe(self, chat_id: int, city: str) -> int:
+        """
+        Подписать чат; возвращает новую версию подписок
+        """
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO subscriptions (chat_id, city, subscribed_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (chat_id) DO UPDATE SET city = excluded.city",
+                (chat_id, city, time.time())
+            )
+            return self._bump()
+
+    def unsubscribe(self, chat_id: int) -> Optional[int]:
+        """
+        Отписать чат; возвращает новую версию подписок или None,
+        если чат не был подписан
+        """
+
+        with self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM subscriptions WHERE chat_id = ?",
+                (chat_id,)
+            )
+            if cursor.rowcount == 0:
+                return None
+            return self._bump()
+
+
+@dataclass(frozen=True)
+class SubscriptionSnapshot:
+    """
+    Неизменяемый срез подписок на момент версии реестра
+    """
+
+    version: int
+    by_city: Mapping[str, frozenset[int]]
+
+    def __len__(self) -> int:
+        return sum(len(users) for users in self.by_city.values())
+
+
+class SubscriptionRegistry:
+    """
+    Подписки процесса в памяти: пользователь -> город и обратный
+    индекс город -> пользователи
+
+    Изменения стоят O(1) и увеличивают версию. Снимок строится
+    один раз на версию, поэтому рассылка работает с неизменяемыми
+    данными, пока обработчики подписывают и отписывают пользователей.
+
+    store_version - версия общей базы, которой соответствует реестр:
+    по ней процесс замечает изменения, сделанные другим процессом
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._cities: dict[int, str] = {}
+        self._users: dict[str, set[int]] = {}
+        self._version = 0
+        self._snapshot: Optional[SubscriptionSnapshot] = None
+        self.store_version: Optional[int] = None
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self._cities
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def city_of(self, chat_id: int) -> Optional[str]:
+        return self._cities.get(chat_id)
+
+    def _follow(self, store_version: Optional[int]) -> None:
+        # Версия базы продвигается, только если между нашими изменениями
+        # не было чужих - иначе следующая сверка перечитает базу
+        if store_version is None:
+            return
+        if self.store_version is not None and self.store_version == store_version - 1:
+            self.store_version = store_version
+        else:
+            self.store_version = None
+
+    def set(self, chat_id: int, city: str, store_version: Optional[int] = None) -> None:
+        with self._lock:
+            self._detach(chat_id)
+            self._cities[chat_id] = city
+            self._users.setdefault(city, set()).add(chat_id)
+            self._version += 1
+            self._follow(store_version)
+
+    def remove(self, chat_id: int, store_version: Optional[int] = None) -> Optional[str]:
+        with self._lock:
+            city = self._detach(chat_id)
+            if city is not None:
+                self._version += 1
+            self._follow(store_version)
+            return city
+
+    def replace(
+        self,
+        pairs: Iterable[tuple[int, str]],
+        store_version: Optional[int] = None
+    ) -> None:
+        """
+        Заменить все подписки, например, после чтения из базы
+        """
+
+        cities = dict(pairs)
+        users: dict[str, set[int]] = {}
+        for chat_id, city in cities.items():
+            users.setdefault(city, set()).add(chat_id)
+
+        with self._lock:
+            self._cities = cities
+            self._users = users
+            self._version += 1
+            self.store_version = store_version
+
+    def users_in(self, city: str) -> frozenset[int]:
+        return self.snapshot().by_city.get(city, frozenset())
+
+    def snapshot(self) -> SubscriptionSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != self._version:
+                self._snapshot = SubscriptionSnapshot(
+                    version=self._version,
+                    by_city=MappingProxyType({
+                        city: frozenset(users) for city, users in self._users.items()
+                    })
+                )
+            return self._snapshot
+
+    def _detach(self, chat_id: int) -> Optional[str]:
+        city = self._cities.pop(chat_id, None)
+        if city is not None:
+            users = self._users[city]
+            users.discard(chat_id)
+            if not users:
+                del self._users[city]
+        return city
+
+
+@lru_cache(maxsize=None)
+def get_subscription_registry() -> SubscriptionRegistry:
+    """
+    Глобальный реестр подписок процесса
+    """
+
+    return SubscriptionRegistry()
+
+
+@lru_cache(maxsize=None)
+def get_subscription_store() -> SubscriptionStore:
+    """
+    Глобальное хранилище подписок
+    """
+
+    return SubscriptionStore(get_connection())
+
+
+def load_subscriptions() -> None:
+    """
+    Заполнить подписки процесса из общей базы
+    """
+
+    version, pairs = get_subscription_store().all()
+    get_subscription_registry().replace(pairs, version)
+
+
+def sync_subscriptions() -> SubscriptionRegistry:
+    """
+    Реестр подписок, сверенный с общей базой
+
+    Базу перечитываем, только если ее версия изменилась - например,
+    другой процесс отписал чат, которому нельзя доставить сообщение
+    """
+
+    registry = get_subscription_registry()
+    if registry.store_version != get_subscription_store().version():
+        load_subscriptions()
+    return registry
+
+
+def is_subscribed(chat_id: int) -> bool:
+    return chat_id in sync_subscriptions()
+
+
+def subscribe(chat_id: int, city: str) -> None:
+    version = get_subscription_store().subscribe(chat_id, city)
+    get_subscription_registry().set(chat_id, city, version)
+
+
+def unsubscribe(chat_id: int) -> bool:
+    version = get_subscription_store().unsubscribe(chat_id)
+    get_subscription_registry().remove(chat_id, version)
+    return version is not None
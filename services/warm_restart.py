@@ -0,0 +1,166 @@
+import logging
+import os
+import pickle
+from typing import Callable, Optional
+
+from config import DATA_DIR
+from services.city_catalog import city_catalog
+from services.daily_forecast import get_daily_forecast_service
+from services.forecast import get_forecast_service
+from services.forecast_cache import CacheEntry, ForecastCache
+from services.report_renderer import report_renderer
+from services.snapshot import (
+    NO_EXPIRY,
+    SECTION_DAILY,
+    SECTION_FORECASTS,
+    SECTION_POPULARITY,
+    SECTION_REPORTS,
+    Snapshot,
+    write_snapshot
+)
+
+logger = logging.getLogger(__name__)
+
+# Снимок кэшей для быстрого старта после перезапуска
+SNAPSHOT_PATH = os.path.join(DATA_DIR, "warm.snapshot")
+
+# Снимок, из которого кэши подгружаются по мере обращений
+_snapshot: Optional[Snapshot] = None
+
+
+def _report_key(key: tuple[str, str, str]) -> str:
+    return "|".join(key)
+
+
+def _cached_forecasts(
+    cache: ForecastCache,
+    report_expiry: dict[str, float]
+) -> list[tuple[str, float, bytes]]:
+    """
+    Живые записи кэша для снимка; срок отчета - срок его прогноза
+    """
+
+    entries: list[tuple[str, float, bytes]] = []
+    for key, entry in cache.items():
+        if entry.value is None or entry.ttl_left() <= 0:
+            continue
+        entries.append((key, entry.expires_at, pickle.dumps(entry.value)))
+        report_expiry[entry.value.digest] = entry.expires_at
+    return entries
+
+
+def _restore_from(snapshot: Snapshot, section: int) -> Callable[[str], Optional[CacheEntry]]:
+    def restore(key: str) -> Optional[CacheEntry]:
+        found = snapshot.get(section, key)
+        if found is None:
+            return None
+        expires_at, payload = found
+        return CacheEntry(value=pickle.loads(payload), expires_at=expires_at)
+
+    return restore
+
+
+def save_warm_state(path: str = SNAPSHOT_PATH) -> int:
+    """
+    Сохранить кэши прогнозов, готовые отчеты и популярность городов
+    """
+
+    forecast_service = get_forecast_service()
+    daily_service = get_daily_forecast_service()
+
+    # Записи прошлого снимка, к которым не обращались, переносим в новый
+    carried_reports: dict[str, bytes] = {}
+    if _snapshot is not None:
+        for key in list(_snapshot.keys(SECTION_FORECASTS)):
+            forecast_service.cache.peek(key)
+        for key in list(_snapshot.keys(SECTION_DAILY)):
+            daily_service.cache.peek(key)
+        for key in list(_snapshot.keys(SECTION_REPORTS)):
+            found = _snapshot.get(SECTION_REPORTS, key)
+            if found is not None:
+                carried_reports[key] = found[1]
+
+    # Отчет живет, пока жив прогноз, по которому он отрисован
+    report_expiry: dict[str, float] = {}
+    forecasts = _cached_forecasts(forecast_service.cache, report_expiry)
+    daily = _cached_forecasts(daily_service.cache, report_expiry)
+
+    texts = dict(carried_reports)
+    for key, text in report_renderer.items():
+        texts[_report_key(key)] = text.encode("utf-8")
+
+    reports = [
+        (key, report_expiry[key.split("|", 1)[0]], text)
+        for key, text in texts.items()
+        if key.split("|", 1)[0] in report_expiry
+    ]
+
+    popularity = forecast_service.popularity
+    counters = [
+        ("sketch", NO_EXPIRY, popularity.sketch.to_bytes()),
+        ("top", NO_EXPIRY, popularity.dump_top()),
+    ]
+
+    # Открытый снимок нужно закрыть до замены файла
+    close_snapshot()
+    total = write_snapshot(path, {
+        SECTION_FORECASTS: forecasts,
+        SECTION_DAILY: daily,
+        SECTION_REPORTS: reports,
+        SECTION_POPULARITY: counters,
+    })
+    logger.info(
+        f"💾 Снимок кэшей сохранен: прогнозов {len(forecasts)}, "
+        f"по дням {len(daily)}, отчетов {len(reports)}"
+    )
+    return total
+
+
+def load_warm_state(path: str = SNAPSHOT_PATH) -> bool:
+    """
+    Подключить снимок прошлого запуска
+
+    Популярность восстанавливается сразу, а прогнозы и отчеты читаются
+    из снимка только при первом обращении к ним
+    """
+
+    global _snapshot
+
+    # Пространственный индекс городов дешевле построить сразу
+    city_catalog.build_index()
+
+    snapshot = Snapshot.open(path)
+    if snapshot is None:
+        return False
+
+    forecast_service = get_forecast_service()
+
+    sketch = snapshot.get(SECTION_POPULARITY, "sketch")
+    top = snapshot.get(SECTION_POPULARITY, "top")
+    if sketch is not None and top is not None:
+        forecast_service.popularity.restore(sketch[1], top[1])
+
+    def restore_report(key: tuple[str, str, str]) -> Optional[str]:
+        found = snapshot.get(SECTION_REPORTS, _report_key(key))
+        return found[1].decode("utf-8") if found is not None else None
+
+    forecast_service.cache.restore = _restore_from(snapshot, SECTION_FORECASTS)
+    get_daily_forecast_service().cache.restore = _restore_from(snapshot, SECTION_DAILY)
+    report_renderer.restore = restore_report
+    _snapshot = snapshot
+
+    logger.info(f"♻️ Подключен снимок кэшей: {len(snapshot)} актуальных записей")
+    return True
+
+
+def close_snapshot() -> None:
+    global _snapshot
+
+    if _snapshot is None:
+        return
+
+    get_forecast_service().cache.restore = None
+    get_daily_forecast_service().cache.restore = None
+    report_renderer.restore = None
+    _snapshot.close()
+    _snapshot = None
@@ -1,8 +1,22 @@
 from datetime import datetime
+from functools import lru_cache
+import logging
 import math
 from typing import Any, Optional
 
-import requests
+from config import UPSTREAM_TIMEOUT
+from services.daily import ThreeHourlySeries
+from services.hourly import HourlySeries
+from services.quota import get_quota
+
+logger = logging.getLogger(__name__)
+
+# Сколько 3-часовых интервалов запрашивать для ближайшего прогноза
+HOURLY_FORECAST_CNT = 4
+# Имя источника в лимитах UPSTREAM_LIMITS
+PROVIDER = "openweathermap"
+# Запросов за один get_forecast_data: текущая погода и почасовой прогноз
+FORECAST_DATA_REQUESTS = 2
 
 
 class WeatherService:
@@ -22,11 +36,15 @@ class WeatherService:
         Ваша функция получения погоды, переведенная в асинхронный стиль
         """
 
+        import requests
+
         try:
             # Делаем запрос для получения прогноза погоды
+            get_quota().acquire(PROVIDER)
             response = requests.get(
                 "http://api.openweathermap.org/data/2.5/weather?q={}&lang=ru&units=metric&appid=4ba714d9111450e5537f17134b7235e4"
-                .format(city_name)
+                .format(city_name),
+                timeout=UPSTREAM_TIMEOUT
             )
 
             if response.status_code != 200:
@@ -66,18 +84,36 @@ class WeatherService:
 
             return weather_text
         except Exception as e:
-            print(f"Error description: {e}")
+            logger.error(f"Ошибка запроса к OpenWeatherMap для {city_name}: {e}")
             return None
 
+    @staticmethod
+    def _location_query(
+        city_name: str,
+        coordinates: Optional[tuple[float, float]]
+    ) -> str:
+        """
+        Параметры местоположения: координаты, если известны, иначе название
+        """
+
+        if coordinates is not None:
+            return "lat={}&lon={}".format(*coordinates)
+        return "q={}".format(city_name)
+
     def get_forecast_data(
         self,
-        city_name: str
+        city_name: str,
+        coordinates: Optional[tuple[float, float]] = None
     ) -> Optional[dict[str, Any]]:
+        import requests
+
         try:
             # Делаем запрос для получения прогноза погоды
+            get_quota().acquire(PROVIDER)
             response = requests.get(
-                "http://api.openweathermap.org/data/2.5/weather?q={}&lang=ru&units=metric&appid=4ba714d9111450e5537f17134b7235e4"
-                .format(city_name)
+                "http://api.openweathermap.org/data/2.5/weather?{}&lang=ru&units=metric&appid=4ba714d9111450e5537f17134b7235e4"
+                .format(self._location_query(city_name, coordinates)),
+                timeout=UPSTREAM_TIMEOUT
             )
 
             if response.status_code != 200:
@@ -106,13 +142,87 @@ class WeatherService:
                 "sunrise_timestamp": sunrise_timestamp,
                 "sunset_timestamp": sunset_timestamp,
                 "length_of_the_day": length_of_the_day,
-                "weather_description": weather_description
+                "weather_description": weather_description,
+                "timezone": data.get("timezone", 0)
             }
+
+            hourly = self.get_hourly_forecast(city_name, coordinates=coordinates)
+            if hourly is not None:
+                result["hourly"] = hourly
+
             return result
         except Exception as e:
-            print(f"Error description: {e}")
+            logger.error(f"Ошибка запроса к OpenWeatherMap для {city_name}: {e}")
+            return None
+
+    def get_hourly_forecast(
+        self,
+        city_name: str,
+        cnt: int = HOURLY_FORECAST_CNT,
+        coordinates: Optional[tuple[float, float]] = None
+    ) -> Optional[HourlySeries]:
+        """
+        Прогноз с шагом 3 часа, ограниченный cnt интервалами
+        """
+
+        import requests
+
+        try:
+            get_quota().acquire(PROVIDER)
+            response = requests.get(
+                "http://api.openweathermap.org/data/2.5/forecast?{}&cnt={}&lang=ru&units=metric&appid=4ba714d9111450e5537f17134b7235e4"
+                .format(self._location_query(city_name, coordinates), cnt),
+                timeout=UPSTREAM_TIMEOUT
+            )
+
+            if response.status_code != 200:
+                return None
+
+            return HourlySeries.from_owm(response.json())
+        except Exception as e:
+            logger.error(f"Ошибка запроса к OpenWeatherMap для {city_name}: {e}")
+            return None
+
+    def get_daily_forecast(
+        self,
+        city_name: str,
+        coordinates: Optional[tuple[float, float]] = None
+    ) -> Optional[ThreeHourlySeries]:
+        """
+        Прогноз на 5 дней с шагом 3 часа
+        """
+
+        import requests
+
+        try:
+            get_quota().acquire(PROVIDER)
+            response = requests.get(
+                "http://api.openweathermap.org/data/2.5/forecast?{}&lang=ru&units=metric&appid=4ba714d9111450e5537f17134b7235e4"
+                .format(self._location_query(city_name, coordinates)),
+                timeout=UPSTREAM_TIMEOUT
+            )
+
+            if response.status_code != 200:
+                return None
+
+            series = ThreeHourlySeries.from_owm(response.json())
+            return series if len(series) else None
+        except Exception as e:
+            logger.error(f"Ошибка запроса к OpenWeatherMap для {city_name}: {e}")
             return None
 
 
-# Глобальный экземпляр сервиса погоды
-weather_service = WeatherService()
+@lru_cache(maxsize=None)
+def get_weather_service() -> WeatherService:
+    """
+    Глобальный экземпляр сервиса погоды
+    """
+
+    return WeatherService()
+
+
+def __getattr__(name: str):
+    # Глобальный экземпляр создается лениво, при первом обращении
+    if name == "weather_service":
+        return get_weather_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")